@@ -0,0 +1,93 @@
+"""Benchmark: row-by-row vs columnar CSV ingestion for the Sheets append.
+
+Generates Rocket Money style exports of increasing size, with a share of
+rows already "in the sheet", and times load_new_rows() with each engine.
+The columnar engine needs pandas; without it only the row engine is timed.
+
+Usage:
+    python benchmarks/bench_csv_ingest.py [--rows 1000 100000 1000000]
+"""
+
+import os
+import sys
+import csv
+import random
+import shutil
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google_services.ingest import load_new_rows, _load_pandas  # noqa: E402
+from utils.logger import LoopLog  # noqa: E402
+
+HEADER = ["Date", "Original Date", "Account Type", "Account Name", "Account Number",
+          "Institution Name", "Name", "Custom Name", "Amount", "Description",
+          "Category", "Note", "Ignored From", "Tax Deductible"]
+
+
+def write_export(path, rows, seed=0):
+    """Write a synthetic export and return the keys of its first half.
+
+    Args:
+        path: CSV file to write
+        rows: Number of transactions
+        seed: Random seed
+
+    Returns:
+        set: Keys of half the rows, standing in for the sheet's existing keys
+    """
+    rng = random.Random(seed)
+    existing = set()
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for i in range(rows):
+            date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            amount = f"{rng.uniform(-500, 500):.2f}"
+            description = f"Merchant {i}"
+            writer.writerow([date, date, "Credit Card", "Card", "1234", "Bank",
+                             description, "", amount, description, "Shopping", "", "", ""])
+            if i % 2 == 0:
+                existing.add((date, amount, description))
+    return existing
+
+
+def run(path, existing, engine):
+    """Time one load_new_rows() call and return (seconds, new row count)."""
+    keys = set(existing)
+    loop_log = LoopLog(f"bench {engine}", samples=0)
+    start = time.perf_counter()
+    result = load_new_rows([path], keys, loop_log, engine)
+    return time.perf_counter() - start, len(result.rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000],
+                        help="Export sizes to time (default: 1000 100000 1000000)")
+    args = parser.parse_args()
+
+    engines = ["rows"]
+    if _load_pandas():
+        engines.append("columnar")
+    else:
+        print("pandas not installed, timing the row engine only")
+
+    workdir = tempfile.mkdtemp(prefix="bench_csv_ingest_")
+    try:
+        for rows in args.rows:
+            path = os.path.join(workdir, f"export_{rows}.csv")
+            existing = write_export(path, rows)
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{rows} rows ({size_mb:.1f} MB):")
+            for engine in engines:
+                seconds, new = run(path, existing, engine)
+                print(f"  {engine:<9} {seconds:8.3f} s  {new} new rows")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Micro-benchmark: download-link extraction from saved export emails.
+
+Compares the streaming DownloadLinkParser used by extract_download_link()
+with the previous BeautifulSoup tree walk. BeautifulSoup is no longer a
+dependency of the pipeline; install beautifulsoup4 to include it here.
+
+Usage:
+    python benchmarks/bench_link_extraction.py [--repeat N]
+"""
+
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_processor.processor import DownloadLinkParser  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def streaming_link(body):
+    """Find the anchor with the streaming parser."""
+    parser = DownloadLinkParser()
+    return parser.href if parser.parse(body) else None
+
+
+def beautifulsoup_link(body):
+    """Find the anchor with the previous BeautifulSoup implementation."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(body, "html.parser")
+    for a in soup.find_all('a'):
+        if a.text.strip().lower() == 'download file':
+            return a['href'] if a.has_attr('href') else None
+    return None
+
+
+def bench(name, func, body, repeat):
+    """Time func(body) and print the mean per call."""
+    seconds = timeit.timeit(lambda: func(body), number=repeat)
+    print(f"  {name:<14} {seconds / repeat * 1e6:10.1f} us/call")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=500, help="Calls per measurement (default: 500)")
+    args = parser.parse_args()
+
+    try:
+        import bs4  # noqa: F401
+        have_bs4 = True
+    except ImportError:
+        have_bs4 = False
+        print("beautifulsoup4 not installed, timing the streaming parser only")
+
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if not name.endswith(".html"):
+            continue
+        with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+            body = f.read()
+        print(f"{name} ({len(body)} chars)")
+        streaming = bench("streaming", streaming_link, body, args.repeat)
+        if have_bs4:
+            if streaming_link(body) != beautifulsoup_link(body):
+                print("  MISMATCH between streaming and BeautifulSoup results")
+            soup = bench("beautifulsoup", beautifulsoup_link, body, args.repeat)
+            print(f"  speedup        {soup / streaming:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Parse IMAP BODYSTRUCTURE responses and decode single fetched body parts."""
+
+import re
+import base64
+import quopri
+from collections import namedtuple
+
+
+_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\r\n|([^\s()"]+))', re.S)
+
+
+# A leaf MIME part: section number for BODY[...], "type/subtype", charset
+# and Content-Transfer-Encoding (both lower case, charset None if undeclared)
+BodyPart = namedtuple("BodyPart", ["section", "content_type", "charset", "encoding"])
+
+
+def flatten_response(data):
+    """Join imaplib response data, re-inserting literals in {n} form.
+
+    Args:
+        data: Data list returned by imaplib for a FETCH command
+
+    Returns:
+        bytes: The response as one byte string
+    """
+    flat = b""
+    for item in data:
+        if isinstance(item, tuple):
+            flat += item[0] + b"\r\n" + item[1]
+        elif item:
+            flat += item
+    return flat
+
+
+def parse_sexp(text):
+    """Parse an IMAP parenthesized list into nested Python lists.
+
+    Quoted strings, atoms and literals become bytes; NIL becomes None.
+
+    Args:
+        text: Raw response bytes
+
+    Returns:
+        list: Parsed top-level items
+    """
+    stack = [[]]
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            break
+        pos = match.end()
+        open_paren, close_paren, quoted, literal_len, atom = match.groups()
+        if open_paren:
+            stack.append([])
+        elif close_paren:
+            if len(stack) > 1:
+                item = stack.pop()
+                stack[-1].append(item)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", quoted))
+        elif literal_len is not None:
+            size = int(literal_len)
+            stack[-1].append(text[pos:pos + size])
+            pos += size
+        else:
+            stack[-1].append(None if atom.upper() == b"NIL" else atom)
+    return stack[0]
+
+
+def _text(value):
+    """Lower-case text of an atom or string, empty for NIL or a list."""
+    return value.decode("ascii", errors="replace").lower() if isinstance(value, bytes) else ""
+
+
+def iter_parts(body, section=""):
+    """Yield every leaf part of a parsed BODYSTRUCTURE with its section number.
+
+    Args:
+        body: Parsed BODYSTRUCTURE list
+        section: Section prefix of body (empty for the whole message)
+
+    Yields:
+        BodyPart: Each non-multipart part, in document order
+    """
+    if body and isinstance(body[0], list):
+        # Multipart: the child parts are the leading list items
+        number = 0
+        for child in body:
+            if not isinstance(child, list):
+                break
+            number += 1
+            yield from iter_parts(child, f"{section}.{number}" if section else str(number))
+        return
+
+    params = body[2] if len(body) > 2 and isinstance(body[2], list) else []
+    charset = None
+    for name, value in zip(params[::2], params[1::2]):
+        if _text(name) == "charset":
+            charset = _text(value)
+    yield BodyPart(
+        section or "1",
+        f"{_text(body[0])}/{_text(body[1])}",
+        charset,
+        _text(body[5]) if len(body) > 5 else "",
+    )
+
+
+def find_part(data, content_type="text/html"):
+    """Find the first part of a content type in a FETCH (BODYSTRUCTURE) response.
+
+    Args:
+        data: Data list returned by imaplib for the FETCH command
+        content_type: MIME type to look for (default: text/html)
+
+    Returns:
+        BodyPart: The matching part, or None if there is none
+    """
+    items = parse_sexp(flatten_response(data))
+    for item in items:
+        if not isinstance(item, list):
+            continue
+        for key, value in zip(item[::2], item[1::2]):
+            if _text(key) == "bodystructure" and isinstance(value, list):
+                for part in iter_parts(value):
+                    if part.content_type == content_type:
+                        return part
+    return None
+
+
+def decode_part(payload, part):
+    """Decode a fetched part using its transfer encoding and charset.
+
+    Args:
+        payload: Raw bytes of the part as fetched with BODY.PEEK[section]
+        part: BodyPart describing the payload
+
+    Returns:
+        str: Decoded text
+    """
+    if part.encoding == "base64":
+        payload = base64.b64decode(payload)
+    elif part.encoding == "quoted-printable":
+        payload = quopri.decodestring(payload)
+    try:
+        return payload.decode(part.charset or "utf-8", errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
@@ -0,0 +1,68 @@
+"""Persisted checkpoint of the highest mailbox UID already processed."""
+
+import os
+import json
+from utils.logger import log
+
+
+DEFAULT_CHECKPOINT_FILE = "email_checkpoint.json"
+
+
+class MailboxCheckpoint:
+    """Highest processed message UID, scoped to the mailbox's UIDVALIDITY.
+
+    UIDs are only comparable while UIDVALIDITY stays the same, so a change in
+    UIDVALIDITY resets the checkpoint.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_FILE):
+        """Load the checkpoint from disk.
+
+        Args:
+            path: JSON file the checkpoint is persisted to
+        """
+        self.path = path
+        self.uidvalidity = None
+        self.last_uid = 0
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                self.uidvalidity = data.get("uidvalidity")
+                self.last_uid = int(data.get("last_uid", 0))
+            except (OSError, ValueError) as e:
+                log(f"Could not read email checkpoint {path}, starting fresh: {str(e)}", "error")
+
+    def last_uid_for(self, uidvalidity):
+        """Return the last processed UID if it belongs to this UIDVALIDITY.
+
+        Args:
+            uidvalidity: Current UIDVALIDITY of the mailbox
+
+        Returns:
+            int: Last processed UID, or 0 if unknown or invalidated
+        """
+        if self.uidvalidity != uidvalidity:
+            if self.uidvalidity is not None:
+                log(f"Mailbox UIDVALIDITY changed ({self.uidvalidity} -> {uidvalidity}), resetting checkpoint")
+            return 0
+        return self.last_uid
+
+    def advance(self, uidvalidity, uid):
+        """Record uid as processed if it is newer than the checkpoint, and save.
+
+        Args:
+            uidvalidity: Current UIDVALIDITY of the mailbox
+            uid: UID of the processed message
+        """
+        if self.uidvalidity != uidvalidity:
+            self.uidvalidity = uidvalidity
+            self.last_uid = 0
+        if uid <= self.last_uid:
+            return
+        self.last_uid = uid
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"uidvalidity": self.uidvalidity, "last_uid": self.last_uid}, f)
+        except OSError as e:
+            log(f"Could not save email checkpoint {self.path}: {str(e)}", "error")
@@ -0,0 +1,134 @@
+"""Persistent IMAP connection shared across email checks in a run."""
+
+import re
+import ssl
+import time
+import imaplib
+from config import GMAIL_USER, GMAIL_PASS
+from utils.logger import log
+
+
+# Errors that mean the connection is gone and a reconnect may help
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, ssl.SSLError, OSError, EOFError)
+
+
+class ImapConnection:
+    """One authenticated IMAP session with the inbox selected.
+
+    The session is opened lazily and kept for the whole run. While waiting,
+    keepalive() sends NOOP instead of logging out and back in, and run()
+    reconnects only when the connection has actually dropped.
+
+    Usage:
+        with ImapConnection() as connection:
+            result, data = connection.run(lambda mail: mail.uid("search", None, "ALL"))
+    """
+
+    def __init__(self, host="imap.gmail.com", port=None, user=None, password=None,
+                 use_ssl=True, mailbox="inbox"):
+        """Configure the connection.
+
+        Args:
+            host: IMAP server hostname (default: imap.gmail.com)
+            port: IMAP server port (default: 993 with SSL, 143 without)
+            user: Login username (default: GMAIL_USER from config)
+            password: Login password (default: GMAIL_PASS from config)
+            use_ssl: Connect with IMAP4_SSL when True, plain IMAP4 otherwise
+            mailbox: Mailbox to select (default: inbox)
+        """
+        self.host = host
+        self.port = port or (imaplib.IMAP4_SSL_PORT if use_ssl else imaplib.IMAP4_PORT)
+        self.user = user or GMAIL_USER
+        self.password = password or GMAIL_PASS
+        self.use_ssl = use_ssl
+        self.mailbox = mailbox
+        self.connects = 0
+        self._mail = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    @property
+    def mail(self):
+        """The underlying imaplib client, connected on first access."""
+        if self._mail is None:
+            self.connect()
+        return self._mail
+
+    def connect(self):
+        """Open the connection, log in and select the mailbox."""
+        self.close()
+        log(f"Connecting to IMAP server {self.host}:{self.port}...")
+        if self.use_ssl:
+            mail = imaplib.IMAP4_SSL(self.host, self.port)
+        else:
+            mail = imaplib.IMAP4(self.host, self.port)
+        log(f"Attempting login with user: {self.user}")
+        mail.login(self.user, self.password)
+        mail.select(self.mailbox)
+        self._mail = mail
+        self.connects += 1
+        log(f"Logged in and selected {self.mailbox}")
+
+    def close(self):
+        """Log out, ignoring errors on a dead connection."""
+        if self._mail is None:
+            return
+        try:
+            self._mail.logout()
+        except Exception:
+            pass
+        self._mail = None
+
+    def run(self, operation):
+        """Run operation(mail), reconnecting once if the connection dropped.
+
+        Args:
+            operation: Callable taking the imaplib client
+
+        Returns:
+            The operation's return value
+        """
+        try:
+            return operation(self.mail)
+        except CONNECTION_ERRORS as e:
+            log(f"IMAP connection lost ({str(e)}), reconnecting...", "error")
+            self.connect()
+            return operation(self._mail)
+
+    def mailbox_status(self, items=("UIDNEXT", "UIDVALIDITY")):
+        """Return numeric STATUS items for the selected mailbox.
+
+        Args:
+            items: STATUS data item names to request
+
+        Returns:
+            dict: Item name to integer value
+        """
+        result, data = self.run(lambda mail: mail.status(self.mailbox, f"({' '.join(items)})"))
+        status = {}
+        for item in items:
+            match = re.search(item.encode() + rb" (\d+)", data[0])
+            if match:
+                status[item] = int(match.group(1))
+        return status
+
+    def keepalive(self, duration, interval=10):
+        """Wait for duration seconds, sending NOOP every interval seconds.
+
+        Args:
+            duration: Total seconds to wait
+            interval: Seconds between NOOPs (default: 10)
+        """
+        end = time.monotonic() + duration
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(interval, remaining))
+            self.run(lambda mail: mail.noop())
@@ -1,121 +1,340 @@
 """Email processing functions for retrieving download links."""
 
+import re
 import time
-import imaplib
 import email
-from bs4 import BeautifulSoup
-from config import GMAIL_USER, GMAIL_PASS
+import imaplib
+from html.parser import HTMLParser
+from email_processor.connection import ImapConnection
+from email_processor.checkpoint import MailboxCheckpoint
+from email_processor.bodystructure import find_part, decode_part
 from utils.logger import log
 
 
-def get_download_link(max_retries=1, wait_time=30):
-    """Get download link from Rocket Money email with retry logic.
+SEARCH_CRITERIA = '(FROM "hello@insights.rocketmoney.com" SUBJECT "Transaction export complete")'
+
+# Allowed clock skew in seconds between this machine and the mail server
+SINCE_SLACK = 120
+
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def imap_date(timestamp):
+    """Format a Unix timestamp as an IMAP search date (e.g. 17-Oct-2026).
+
+    SINCE only compares dates, so the day before the timestamp is used to stay
+    safe across server time zones; received_since() does the exact filtering.
+
+    Args:
+        timestamp: Unix timestamp
+
+    Returns:
+        str: Date in IMAP's dd-Mon-yyyy format
+    """
+    day = time.gmtime(timestamp - 86400)
+    return f"{day.tm_mday:02d}-{_MONTHS[day.tm_mon - 1]}-{day.tm_year}"
+
+
+def build_search_criteria(min_uid=0, since=None):
+    """Build a UID SEARCH query for export emails.
+
+    Args:
+        min_uid: Only match UIDs from this one upwards (default: no bound)
+        since: Only match messages received around or after this Unix
+            timestamp (default: no bound)
+
+    Returns:
+        str: Parenthesized IMAP search criteria
+    """
+    parts = []
+    if min_uid:
+        parts.append(f"UID {min_uid}:*")
+    if since:
+        parts.append(f"SINCE {imap_date(since)}")
+    parts.append(SEARCH_CRITERIA[1:-1])
+    return f"({' '.join(parts)})"
+
+
+def received_since(connection, uids, since):
+    """Keep only the UIDs whose INTERNALDATE is at or after since.
+
+    Args:
+        connection: ImapConnection with the mailbox selected
+        uids: Candidate message UIDs
+        since: Unix timestamp of the export request
+
+    Returns:
+        list: Matching UIDs
+    """
+    if not uids:
+        return []
+    uid_set = ",".join(str(uid) for uid in uids)
+    result, data = connection.run(lambda mail: mail.uid("fetch", uid_set, "(INTERNALDATE)"))
+    matching = []
+    for item in data:
+        if not isinstance(item, bytes):
+            continue
+        uid_match = re.search(rb"UID (\d+)", item)
+        date_tuple = imaplib.Internaldate2tuple(item)
+        if uid_match and date_tuple and time.mktime(date_tuple) >= since - SINCE_SLACK:
+            matching.append(int(uid_match.group(1)))
+    return matching
+
+
+class _AnchorFound(Exception):
+    """Raised by DownloadLinkParser to stop parsing at the matching anchor."""
+
+
+class DownloadLinkParser(HTMLParser):
+    """Incremental HTML parser that stops at the first "Download file" anchor.
+    
+    Only anchor text and href attributes are kept; no tree is built, and
+    parsing ends as soon as the matching anchor closes.
+    """
+    
+    def __init__(self, anchor_text="download file"):
+        super().__init__()
+        self.anchor_text = anchor_text
+        self.href = None
+        self.text = None
+        self.found = False
+        self._in_anchor = False
+        self._href = None
+        self._chunks = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self._in_anchor = True
+            self._href = dict(attrs).get("href")
+            self._chunks = []
+    
+    def handle_data(self, data):
+        if self._in_anchor:
+            self._chunks.append(data)
+    
+    def handle_endtag(self, tag):
+        if tag == "a" and self._in_anchor:
+            self.finish_anchor()
+    
+    def finish_anchor(self):
+        """Check the open anchor, raising _AnchorFound if its text matches."""
+        self._in_anchor = False
+        text = "".join(self._chunks).strip()
+        if text.lower() == self.anchor_text:
+            self.found = True
+            self.href = self._href
+            self.text = text
+            raise _AnchorFound()
+    
+    def parse(self, body, chunk_size=8192):
+        """Feed body in chunks until the anchor is found or the input ends.
+        
+        Args:
+            body: HTML text
+            chunk_size: Characters fed per step (default: 8192)
+            
+        Returns:
+            bool: True if the anchor was found
+        """
+        try:
+            for start in range(0, len(body), chunk_size):
+                self.feed(body[start:start + chunk_size])
+            self.close()
+            # An anchor left open at the end of the document still counts
+            if self._in_anchor:
+                self.finish_anchor()
+        except _AnchorFound:
+            pass
+        return self.found
+
+
+def extract_download_link(body):
+    """Extract the "Download file" link from the HTML body of an export email.
     
     Args:
-        max_retries: Maximum number of retry attempts (default: 1)
-        wait_time: Time to wait between retries in seconds (default: 30)
+        body: Decoded HTML body of the email
         
     Returns:
         str: Download link if found, None otherwise
     """
-    for attempt in range(max_retries):
-        try:
-            log(f"Checking email for Rocket Money download link (attempt {attempt + 1}/{max_retries})...")
-            log(f"Connecting to Gmail IMAP server...")
-            mail = imaplib.IMAP4_SSL("imap.gmail.com")
-            
-            log(f"Attempting login with user: {GMAIL_USER}")
-            mail.login(GMAIL_USER, GMAIL_PASS)
-            log("Successfully logged into Gmail!")
-            
-            mail.select("inbox")
-            log("Selected inbox")
-            
-            # Search for specific email
-            search_criteria = '(FROM "hello@insights.rocketmoney.com" SUBJECT "Transaction export complete")'
-            log(f"Searching with criteria: {search_criteria}")
-            result, data = mail.search(None, search_criteria)
-            
-            if not data[0]:
-                if attempt == max_retries - 1:
-                    log("No matching email found after all retries", "error")
-                    return None
-                log(f"No email found yet, waiting {wait_time} seconds...")
-                mail.logout()
-                time.sleep(wait_time)
-                continue
-            
-            email_ids = data[0].split()
-            latest_email_id = email_ids[-1]
-            log(f"Found {len(email_ids)} matching emails, using most recent")
-            
-            result, msg_data = mail.fetch(latest_email_id, "(RFC822)")
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
-            
-            # Log email details
-            log(f"Email Subject: {msg['subject']}")
-            log(f"Email From: {msg['from']}")
-            log(f"Email Date: {msg['date']}")
-            
-            download_link = None
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                log(f"Processing email part with content type: {content_type}")
-                
-                if content_type == "text/html":
-                    body = part.get_payload(decode=True).decode()
-                    log("Found HTML content in email")
-                    
-                    # Save email content for debugging
-                    with open("email_content.html", "w", encoding="utf-8") as f:
-                        f.write(body)
-                    log("Saved email content to email_content.html for inspection")
-                    
-                    # --- NEW LOGIC: Use BeautifulSoup to find the download link ---
-                    soup = BeautifulSoup(body, "html.parser")
-                    # Find the first anchor with text 'Download file' (strip spaces)
-                    anchor = None
-                    for a in soup.find_all('a'):
-                        if a.text.strip().lower() == 'download file':
-                            anchor = a
-                            break
-                    if anchor and anchor.has_attr('href'):
-                        download_link = anchor['href']
-                        log(f"Found download link using BeautifulSoup: text='{anchor.text.strip()}', href='{download_link}'")
-                        break
-                    # --- END NEW LOGIC ---
-                    
-                    # Fallback: Old method (in case the above fails)
-                    if not download_link:
-                        download_text = "Download file ➔"
-                        pos = body.find(download_text)
-                        if pos != -1:
-                            log(f"Found '{download_text}' text in email")
-                            # Search backwards for the nearest href
-                            href_start = body.rfind('href=\"', 0, pos)
-                            if href_start != -1:
-                                href_end = body.find('"', href_start + 6)
-                                if href_end != -1:
-                                    download_link = body[href_start + 6:href_end]
-                                    log(f"Found download link (fallback): {download_link}")
-                                    break
-                        else:
-                            log(f"Could not find '{download_text}' text in email")
+    # Find the first anchor with text 'Download file' (strip spaces)
+    parser = DownloadLinkParser()
+    if parser.parse(body) and parser.href:
+        download_link = parser.href
+        log(f"Found download link: text='{parser.text}', href='{download_link}'")
+        return download_link
+    
+    # Fallback: Old method (in case the above fails)
+    download_text = "Download file ➔"
+    pos = body.find(download_text)
+    if pos != -1:
+        log(f"Found '{download_text}' text in email")
+        # Search backwards for the nearest href
+        href_start = body.rfind('href=\"', 0, pos)
+        if href_start != -1:
+            href_end = body.find('"', href_start + 6)
+            if href_end != -1:
+                download_link = body[href_start + 6:href_end]
+                log(f"Found download link (fallback): {download_link}")
+                return download_link
+    else:
+        log(f"Could not find '{download_text}' text in email")
+    return None
+
+
+def save_debug_copy(body, path="email_content.html"):
+    """Save the email's HTML body for inspection.
+    
+    Args:
+        body: Decoded HTML body
+        path: File to write (default: email_content.html)
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(body)
+    log(f"Saved email content to {path} for inspection")
+
+
+def find_download_link_in_message(msg, debug=False):
+    """Walk an email message and extract the download link from its HTML part.
+    
+    Args:
+        msg: email.message.Message parsed from the raw email
+        debug: Save the HTML body to email_content.html (default: False)
+        
+    Returns:
+        str: Download link if found, None otherwise
+    """
+    # Log email details
+    log(f"Email Subject: {msg['subject']}")
+    log(f"Email From: {msg['from']}")
+    log(f"Email Date: {msg['date']}")
+    
+    for part in msg.walk():
+        content_type = part.get_content_type()
+        log(f"Processing email part with content type: {content_type}")
+        
+        if content_type == "text/html":
+            body = part.get_payload(decode=True).decode()
+            log("Found HTML content in email")
             
-            mail.logout()
+            if debug:
+                save_debug_copy(body)
             
+            download_link = extract_download_link(body)
             if download_link:
-                log(f"Download link found")
                 return download_link
-            else:
-                log("No download link found in email", "error")
-                
-        except Exception as e:
-            log(f"Error checking email (attempt {attempt + 1}): {str(e)}", "error")
-            if attempt == max_retries - 1:
-                raise
-            time.sleep(wait_time)
-    
     return None
 
+
+def fetch_download_link(connection, uid, debug=False):
+    """Fetch only the HTML part of a message by UID and extract its link.
+    
+    BODYSTRUCTURE is fetched first to locate the text/html section, which is
+    then fetched alone with BODY.PEEK so the message is not marked as read.
+    If the structure has no HTML part, the whole message is fetched (also
+    with PEEK) and walked instead.
+    
+    Args:
+        connection: ImapConnection with the mailbox selected
+        uid: Message UID
+        debug: Save the HTML body to email_content.html (default: False)
+        
+    Returns:
+        str: Download link if found, None otherwise
+    """
+    result, structure = connection.run(lambda mail: mail.uid("fetch", str(uid), "(BODYSTRUCTURE)"))
+    part = find_part(structure, "text/html")
+    
+    if part is None:
+        log("No text/html part in BODYSTRUCTURE, fetching the whole message")
+        result, msg_data = connection.run(lambda mail: mail.uid("fetch", str(uid), "(BODY.PEEK[])"))
+        msg = email.message_from_bytes(msg_data[0][1])
+        return find_download_link_in_message(msg, debug=debug)
+    
+    section = f"BODY.PEEK[{part.section}]"
+    result, msg_data = connection.run(lambda mail: mail.uid("fetch", str(uid), f"({section})"))
+    payload = msg_data[0][1]
+    log(f"Fetched HTML part {part.section} ({len(payload)} bytes, {part.encoding or '7bit'}, {part.charset or 'utf-8'})")
+    body = decode_part(payload, part)
+    
+    if debug:
+        save_debug_copy(body)
+    
+    return extract_download_link(body)
+
+
+def get_download_link(max_retries=1, wait_time=30, connection=None, since=None, checkpoint=None,
+                      debug=False):
+    """Get download link from Rocket Money email with retry logic.
+    
+    One IMAP session is kept for all attempts; between attempts it is kept
+    alive with NOOP and only reconnected if it drops. Only messages above the
+    persisted UID checkpoint (and received after since, when given) are
+    considered, so an older export email is never picked up by mistake.
+    
+    Args:
+        max_retries: Maximum number of retry attempts (default: 1)
+        wait_time: Time to wait between retries in seconds (default: 30)
+        connection: Optional ImapConnection to reuse. When omitted, one is
+            opened for this call and closed before returning.
+        since: Unix timestamp of the export request; older messages are
+            ignored (default: no time bound)
+        checkpoint: MailboxCheckpoint of processed UIDs (default: the one in
+            email_checkpoint.json)
+        debug: Save the email's HTML body to email_content.html (default: False)
+        
+    Returns:
+        str: Download link if found, None otherwise
+    """
+    owns_connection = connection is None
+    if owns_connection:
+        connection = ImapConnection()
+    checkpoint = checkpoint or MailboxCheckpoint()
+    
+    try:
+        for attempt in range(max_retries):
+            try:
+                log(f"Checking email for Rocket Money download link (attempt {attempt + 1}/{max_retries})...")
+                
+                uidvalidity = connection.mailbox_status().get("UIDVALIDITY")
+                last_uid = checkpoint.last_uid_for(uidvalidity)
+                
+                # Search only messages newer than the checkpoint
+                criteria = build_search_criteria(last_uid + 1, since)
+                log(f"Searching with criteria: {criteria}")
+                result, data = connection.run(lambda mail: mail.uid("search", None, criteria))
+                # "n:*" always matches the highest UID, so filter against the checkpoint
+                uids = [int(u) for u in (data[0] or b"").split() if int(u) > last_uid]
+                if since:
+                    uids = received_since(connection, uids, since)
+                
+                if not uids:
+                    if attempt == max_retries - 1:
+                        log("No matching email found after all retries", "error")
+                        return None
+                    log(f"No email found yet, waiting {wait_time} seconds...")
+                    connection.keepalive(wait_time)
+                    continue
+                
+                latest_uid = max(uids)
+                log(f"Found {len(uids)} new matching emails, using most recent (UID {latest_uid})")
+                
+                download_link = fetch_download_link(connection, latest_uid, debug=debug)
+                checkpoint.advance(uidvalidity, latest_uid)
+                
+                if download_link:
+                    log(f"Download link found")
+                    return download_link
+                else:
+                    log("No download link found in email", "error")
+                    
+            except Exception as e:
+                log(f"Error checking email (attempt {attempt + 1}): {str(e)}", "error")
+                if attempt == max_retries - 1:
+                    raise
+                connection.keepalive(wait_time)
+        
+        return None
+    finally:
+        if owns_connection:
+            connection.close()
@@ -0,0 +1,211 @@
+"""Event-driven watcher for the Rocket Money export email using IMAP IDLE."""
+
+import ssl
+import time
+import select
+import imaplib
+from email_processor.connection import ImapConnection, CONNECTION_ERRORS
+from email_processor.processor import build_search_criteria, fetch_download_link
+from email_processor.checkpoint import MailboxCheckpoint
+from utils.logger import log
+
+
+class EmailWatcher:
+    """Watch the inbox for the export email and return its download link.
+
+    The watcher is opened before the export is requested so that it can record
+    the inbox's UIDNEXT as a baseline. Only messages that arrive after that
+    baseline are considered, and the watcher sits in IMAP IDLE between checks
+    so the link is returned as soon as the message lands.
+
+    Usage:
+        with EmailWatcher() as watcher:
+            export_rocket_money_data()
+            download_link = watcher.wait_for_link(timeout=180)
+    """
+
+    def __init__(self, host="imap.gmail.com", port=None, user=None, password=None,
+                 use_ssl=True, idle_refresh=300, connection=None, checkpoint=None, debug=False):
+        """Configure the watcher.
+
+        Args:
+            host: IMAP server hostname (default: imap.gmail.com)
+            port: IMAP server port (default: 993 with SSL, 143 without)
+            user: Login username (default: GMAIL_USER from config)
+            password: Login password (default: GMAIL_PASS from config)
+            use_ssl: Connect with IMAP4_SSL when True, plain IMAP4 otherwise
+            idle_refresh: Maximum seconds to stay in a single IDLE command
+                before re-issuing it (default: 300)
+            connection: Optional ImapConnection to use instead of opening one
+                from the arguments above
+            checkpoint: MailboxCheckpoint advanced as emails are processed
+                (default: the one in email_checkpoint.json)
+            debug: Save each email's HTML body to email_content.html
+                (default: False)
+        """
+        self.connection = connection or ImapConnection(
+            host=host, port=port, user=user, password=password, use_ssl=use_ssl
+        )
+        self.idle_refresh = idle_refresh
+        self.debug = debug
+        self.checkpoint = checkpoint or MailboxCheckpoint()
+        self.baseline_uid = 0
+        self.uidvalidity = None
+        self.supports_idle = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def start(self):
+        """Connect, log in, select the inbox and record the UID baseline."""
+        mail = self.connection.mail
+
+        self.supports_idle = "IDLE" in mail.capabilities
+        if not self.supports_idle:
+            log("IMAP server does not advertise IDLE, watcher will fall back to polling", "error")
+
+        status = self.connection.mailbox_status()
+        self.uidvalidity = status.get("UIDVALIDITY")
+        self.baseline_uid = status["UIDNEXT"] - 1
+        log(f"Email watcher ready (baseline UID {self.baseline_uid})")
+
+    def close(self):
+        """Log out of the IMAP session, ignoring errors on a dead connection."""
+        self.connection.close()
+
+    def wait_for_link(self, timeout=180):
+        """Block until the export email arrives and return its download link.
+
+        Args:
+            timeout: Overall deadline budget in seconds (default: 180)
+
+        Returns:
+            str: Download link if the email arrived in time, None otherwise
+        """
+        links = self.wait_for_links(1, timeout=timeout)
+        return links[0] if links else None
+
+    def wait_for_links(self, count, timeout=180):
+        """Block until count export emails arrive and return their download links.
+
+        Args:
+            count: Number of export emails to wait for
+            timeout: Overall deadline budget in seconds (default: 180)
+
+        Returns:
+            list: Download links in arrival order; shorter than count if the
+                deadline passed first
+        """
+        deadline = time.monotonic() + timeout
+        start = time.monotonic()
+        links = []
+
+        while len(links) < count:
+            uid = self._find_new_message()
+            if uid is not None:
+                log(f"Export email arrived after {time.monotonic() - start:.1f} seconds")
+                download_link = self._fetch_link(uid)
+                self.baseline_uid = uid
+                self.checkpoint.advance(self.uidvalidity, uid)
+                if download_link:
+                    links.append(download_link)
+                else:
+                    log("No download link found in new email, continuing to wait", "error")
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log(f"Received {len(links)}/{count} export emails within {timeout} seconds", "error")
+                break
+
+            if self.supports_idle:
+                try:
+                    self._idle(min(remaining, self.idle_refresh))
+                except CONNECTION_ERRORS as e:
+                    log(f"IMAP connection lost during IDLE ({str(e)}), reconnecting...", "error")
+                    self.connection.connect()
+            else:
+                self.connection.keepalive(min(remaining, 5), interval=5)
+
+        return links
+
+    def _find_new_message(self):
+        """Return the oldest matching message UID above the baseline, if any."""
+        criteria = build_search_criteria(self.baseline_uid + 1)
+        result, data = self.connection.run(lambda mail: mail.uid("search", None, criteria))
+        # "n:*" always matches the highest UID, so filter against the baseline
+        uids = [int(u) for u in (data[0] or b"").split() if int(u) > self.baseline_uid]
+        return min(uids) if uids else None
+
+    def _fetch_link(self, uid):
+        """Fetch a message's HTML part by UID and extract its download link."""
+        return fetch_download_link(self.connection, uid, debug=self.debug)
+
+    def _idle(self, timeout):
+        """Run one IMAP IDLE command until the mailbox changes or timeout expires.
+
+        Args:
+            timeout: Maximum number of seconds to wait in IDLE
+        """
+        mail = self.connection.mail
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        response = mail.readline()
+        if not response.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {response!r}")
+
+        sock = mail.sock
+        end = time.monotonic() + timeout
+        while True:
+            pending = self._has_buffered_data(mail)
+            remaining = end - time.monotonic()
+            if not pending:
+                if remaining <= 0:
+                    break
+                readable, _, _ = select.select([sock], [], [], remaining)
+                if not readable:
+                    break
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed during IDLE")
+            if b"EXISTS" in line or b"RECENT" in line:
+                break
+
+        mail.send(b"DONE\r\n")
+        while True:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+            if line.startswith(tag):
+                break
+
+    @staticmethod
+    def _has_buffered_data(mail):
+        """Check whether response data is already readable without waiting.
+
+        imaplib reads through a buffered file, so untagged lines that arrived
+        in the same segment as the IDLE continuation can sit in that buffer
+        (or in the SSL layer) while the socket itself looks idle to select().
+        The buffer is peeked with the socket briefly non-blocking, which
+        never waits and keeps any bytes it pulls in for the next readline().
+
+        Args:
+            mail: Connected imaplib.IMAP4 instance
+
+        Returns:
+            bool: True if readline() can return without touching the network
+        """
+        sock = mail.sock
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            return bool(mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
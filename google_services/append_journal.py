@@ -0,0 +1,166 @@
+"""Local journal of Google Sheets append batches, for resuming an interrupted append."""
+
+import os
+import json
+import time
+from utils.logger import log
+
+
+DEFAULT_JOURNAL_FILE = "sheet_append_journal.jsonl"
+
+
+class AppendJournal:
+    """Batches of one append run and which of them the sheet has committed.
+
+    The journal holds no row values. Its first line records the target sheet,
+    the source CSVs with their MD5 checksums and each batch's keys. Every
+    committed batch then appends one line with the sheet row it ended on, so
+    a commit costs one short write however long the append is. A later run
+    that finds uncommitted batches re-derives their rows from the unchanged
+    source CSVs and sends just those, without reading the sheet again.
+
+    Usage:
+        journal = AppendJournal()
+        journal.start(sheet, base_row_count, header, sources, batch_keys)
+        for batch in journal.pending:
+            ...append the rows of batch["keys"]...
+            journal.commit(batch["id"], end_row)
+        journal.clear()
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_FILE):
+        """Configure the journal.
+
+        Args:
+            path: JSON lines file the journal is persisted to
+        """
+        self.path = path
+        self.data = None
+
+    def load(self):
+        """Read an existing journal from disk.
+
+        A last line cut short by a crash is ignored, leaving its batch
+        uncommitted.
+
+        Returns:
+            bool: True if a readable journal was found
+        """
+        self.data = None
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            data = json.loads(lines[0])
+            for line in lines[1:]:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    log(f"Ignoring an incomplete line in append journal {self.path}", "error")
+                    break
+                self._apply(data, record["id"], record["end_row"])
+            self.data = data
+            return True
+        except (OSError, ValueError, IndexError, KeyError) as e:
+            log(f"Could not read append journal {self.path}, ignoring it: {str(e)}", "error")
+            return False
+
+    def start(self, sheet, base_row_count, header, sources, batch_keys):
+        """Record a new append run before any batch is sent.
+
+        Args:
+            sheet: Identifier of the target sheet
+            base_row_count: Sheet rows (header included) before the append
+            header: Sheet header row
+            sources: {"path", "md5"} of each source CSV, in read order
+            batch_keys: (Date, Amount, Description) keys of each batch's rows
+        """
+        run_id = time.strftime("%Y%m%d%H%M%S")
+        self.data = {
+            "sheet": sheet,
+            "base_row_count": base_row_count,
+            "header": header,
+            "sources": sources,
+            "batches": [
+                {"id": f"{run_id}-{number + 1}", "keys": keys, "end_row": None}
+                for number, keys in enumerate(batch_keys)
+            ],
+        }
+        # The first line is written to a temporary file moved into place, so
+        # a journal on disk always starts with a complete record
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(self.data) + "\n")
+        os.replace(temp_path, self.path)
+
+    @property
+    def sheet(self):
+        """Identifier of the sheet the journal belongs to."""
+        return self.data["sheet"]
+
+    @property
+    def base_row_count(self):
+        """Sheet rows before the journaled append started."""
+        return self.data["base_row_count"]
+
+    @property
+    def header(self):
+        """Sheet header row at the start of the append."""
+        return self.data["header"]
+
+    @property
+    def sources(self):
+        """{"path", "md5"} of each source CSV the rows are read from."""
+        return self.data["sources"]
+
+    @property
+    def batches(self):
+        """Every journaled batch, in order."""
+        return self.data["batches"]
+
+    @property
+    def pending(self):
+        """Batches not yet committed, in order."""
+        return [batch for batch in self.batches if batch["end_row"] is None]
+
+    @property
+    def last_row(self):
+        """Last sheet row written by a committed batch, or the base row count."""
+        committed = [batch["end_row"] for batch in self.batches if batch["end_row"] is not None]
+        return committed[-1] if committed else self.base_row_count
+
+    def keys(self):
+        """Keys of every journaled row.
+
+        Returns:
+            list: (Date, Amount, Description) tuples
+        """
+        return [tuple(key) for batch in self.batches for key in batch["keys"]]
+
+    def commit(self, batch_id, end_row):
+        """Mark a batch as committed and append the commit to the file.
+
+        Args:
+            batch_id: ID of the batch
+            end_row: Last sheet row the batch was written to
+        """
+        end_row = self._apply(self.data, batch_id, end_row)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"id": batch_id, "end_row": end_row}) + "\n")
+
+    def clear(self):
+        """Delete the journal once the append has finished."""
+        self.data = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _apply(self, data, batch_id, end_row):
+        """Set a batch's end row in data, defaulting to right after the last one."""
+        for batch in data["batches"]:
+            if batch["id"] == batch_id:
+                committed = [b["end_row"] for b in data["batches"] if b["end_row"] is not None]
+                last_row = committed[-1] if committed else data["base_row_count"]
+                batch["end_row"] = end_row or last_row + len(batch["keys"])
+                return batch["end_row"]
+        raise KeyError(batch_id)
@@ -0,0 +1,112 @@
+"""Shared Google API credentials and clients, built once per process."""
+
+import threading
+import httplib2
+import gspread
+import google_auth_httplib2
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+from utils.logger import log
+
+
+CREDENTIALS_FILE = "credentials.json"
+
+# One set of scopes covers Drive uploads, gspread and the Sheets v4 API.
+# drive.file only reaches files this app created, which is all the upload
+# and its checksum lookup need; gspread opens the sheet by key, which only
+# needs the spreadsheets scope.
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+]
+
+# Seconds before an idle API request is abandoned
+HTTP_TIMEOUT = 120
+
+_lock = threading.Lock()
+_credentials = None
+_services = {}
+_gspread_client = None
+_local = threading.local()
+
+
+def get_credentials():
+    """Load the service account credentials on first use.
+
+    The credentials object keeps its access token and refreshes it only when
+    it has expired, so every client built from it shares one token.
+
+    Returns:
+        google.oauth2.service_account.Credentials: Scoped credentials
+    """
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            _credentials = service_account.Credentials.from_service_account_file(
+                CREDENTIALS_FILE, scopes=SCOPES)
+            log(f"Loaded Google service account credentials from {CREDENTIALS_FILE}")
+        return _credentials
+
+
+def _authorized_http():
+    """Keep-alive HTTP transport for the calling thread.
+
+    httplib2 connections must not be shared between threads, so each thread
+    keeps its own and reuses it for every request it sends.
+
+    Returns:
+        google_auth_httplib2.AuthorizedHttp: Transport signing requests
+    """
+    http = getattr(_local, "http", None)
+    if http is None:
+        http = google_auth_httplib2.AuthorizedHttp(
+            get_credentials(), http=httplib2.Http(timeout=HTTP_TIMEOUT))
+        _local.http = http
+    return http
+
+
+def _build_request(http, *args, **kwargs):
+    """Build each API request on the calling thread's transport."""
+    return HttpRequest(_authorized_http(), *args, **kwargs)
+
+
+def get_service(api, version):
+    """Return a cached googleapiclient service.
+
+    Built from the discovery documents bundled with google-api-python-client,
+    so no discovery request is made. The service can be used from any thread.
+
+    Args:
+        api: API name, e.g. "drive" or "sheets"
+        version: API version, e.g. "v3"
+
+    Returns:
+        googleapiclient.discovery.Resource: The API service
+    """
+    http = _authorized_http()
+    with _lock:
+        service = _services.get((api, version))
+        if service is None:
+            service = build(api, version, http=http, requestBuilder=_build_request,
+                            static_discovery=True, cache_discovery=False)
+            _services[(api, version)] = service
+            log(f"Google {api} {version} client ready")
+        return service
+
+
+def get_gspread_client():
+    """Return a cached gspread client.
+
+    gspread sends its requests through one pooled, keep-alive HTTP session
+    authorized with the shared credentials.
+
+    Returns:
+        gspread.Client: Authorized client
+    """
+    global _gspread_client
+    credentials = get_credentials()
+    with _lock:
+        if _gspread_client is None:
+            _gspread_client = gspread.authorize(credentials)
+        return _gspread_client
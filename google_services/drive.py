@@ -2,77 +2,193 @@
 
 import os
 import time
-import glob
-import shutil
 import undetected_chromedriver as uc
 from config import ROCKET_USER, ROCKET_PASS, DRIVE_FOLDER_ID
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
-from rocket_money.driver import get_chrome_options
+from google_services.clients import get_service
+from rocket_money.driver import get_chrome_options, configure_driver, get_download_dir
+from rocket_money.download import download_with_browser_cookies, DirectDownloadUnavailable
+from google_services.upload_manifest import DriveUploadManifest
+from utils.csv_ingest import IngestedCSV, CSVIngester, ingest_csv
+from utils.download_tracker import DownloadTracker
 from utils.logger import log
 
 
-def verify_csv_file(file_path):
-    """Verify that the CSV file exists and has content.
+def get_drive_service():
+    """Return the shared Drive API client, building it on first use.
+    
+    Safe to call from a worker thread to warm the client up while other
+    stages run; concurrent callers wait for the single build.
+    
+    Returns:
+        googleapiclient.discovery.Resource: Drive v3 service
+    """
+    return get_service('drive', 'v3')
+
+
+def list_folder_checksums(drive_service, folder_id):
+    """List a Drive folder once and map each file's MD5 to its ID.
     
     Args:
-        file_path: Path to the CSV file to verify
+        drive_service: Drive v3 service
+        folder_id: ID of the folder to list
         
-    Raises:
-        FileNotFoundError: If file doesn't exist
-        ValueError: If file is empty or has no header row
+    Returns:
+        dict: md5Checksum -> file ID, for files not in the trash
+    """
+    checksums = {}
+    page_token = None
+    while True:
+        response = drive_service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields='nextPageToken, files(id, md5Checksum)',
+            pageSize=1000,
+            pageToken=page_token
+        ).execute()
+        for item in response.get('files', []):
+            if item.get('md5Checksum'):
+                checksums[item['md5Checksum']] = item['id']
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return checksums
+
+
+def save_to_drive(local_file, drive_file_name):
+    """Log a sample of the downloaded CSV and upload it to Google Drive.
+    
+    Args:
+        local_file: IngestedCSV from download_export(), or a path to the CSV
+            in the working directory, which is ingested (validated and
+            hashed) first
+        drive_file_name: Name to give the file in Google Drive
+        
+    Returns:
+        str: Path to the local file
     """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Downloaded CSV file not found: {file_path}")
+    ingested = local_file if isinstance(local_file, IngestedCSV) else ingest_csv(local_file)
+    local_file = ingested.path
     
-    if os.path.getsize(file_path) == 0:
-        raise ValueError("Downloaded CSV file is empty")
+    # Log the header and the first few rows of the CSV
+    log(f"CSV Header: {','.join(ingested.header)}")
+    log("Sample data rows:")
+    for row in ingested.samples:
+        if any(row):  # Only log if row is not empty
+            log(','.join(row))
     
-    with open(file_path, 'r') as f:
-        first_line = f.readline().strip()
-        if not first_line:
-            raise ValueError("CSV file has no header row")
+    # Upload to Google Drive, unless this exact export is already there
+    try:
+        drive_service = get_drive_service()
+        
+        md5 = ingested.md5
+        manifest = DriveUploadManifest()
+        previous = manifest.get(md5)
+        if previous and previous.get('folder') == DRIVE_FOLDER_ID:
+            folder_checksums = list_folder_checksums(drive_service, DRIVE_FOLDER_ID)
+            if md5 in folder_checksums:
+                log(f"Export unchanged since upload of {previous['name']} "
+                    f"(ID: {folder_checksums[md5]}), skipping Drive upload")
+                return local_file
+            log("Previously uploaded copy is no longer in the Drive folder, uploading again")
+            manifest.forget(md5)
+        
+        file_metadata = {
+            'name': drive_file_name,  # Use original filename
+            'parents': [DRIVE_FOLDER_ID]
+        }
+        
+        # Ask for the parents and checksum in the create response, so no
+        # second request is needed to verify the upload
+        media = MediaFileUpload(local_file, mimetype='text/csv', resumable=True)
+        file = drive_service.files().create(body=file_metadata,
+                                          media_body=media,
+                                          fields='id,parents,md5Checksum').execute()
+        
+        log(f"File uploaded to Google Drive with ID: {file.get('id')}")
+        
+        # Verify the file was uploaded to the correct folder
+        if DRIVE_FOLDER_ID in file.get('parents', []):
+            log("File confirmed to be in the correct Drive folder")
+        else:
+            log("Warning: File may not be in the expected Drive folder", "error")
+        
+        if file.get('md5Checksum') and file['md5Checksum'] != md5:
+            log("Warning: Drive checksum does not match the local file", "error")
+        else:
+            manifest.record(md5, file.get('id'), drive_file_name, DRIVE_FOLDER_ID)
+        
+        return local_file
+    
+    except Exception as e:
+        log(f"Error uploading to Google Drive: {str(e)}", "error")
+        raise
 
 
-def download_and_save_to_drive(download_link, max_retries=3):
-    """Download file with retry logic and verification, then upload to Google Drive.
+def download_export(download_link, max_retries=3, session=None, direct=True,
+                    local_file="rocket_money_data.csv"):
+    """Download the export with retry logic and ingest it, without uploading it.
     
     Args:
         download_link: URL to download the file from
         max_retries: Maximum number of retry attempts (default: 3)
+        session: Optional BrowserSession to borrow. When given, the download
+            runs in that (already authenticated) browser and it is left running.
+            If its browser has already been quit, the direct download uses the
+            cookies copied before the quit, and the browser download starts a
+            new browser from the persistent profile.
+        direct: When a session is given, first fetch the file over HTTP with
+            the browser's cookies, and only fall back to the browser download
+            if that is redirected to login (default: True)
+        local_file: Path to save the CSV to (default: rocket_money_data.csv)
         
     Returns:
-        str: Path to the local file
+        tuple: (IngestedCSV of the local file, original file name for Google Drive)
         
     Raises:
         Exception: If download fails after all retries
     """
     log("Downloading file...")
-    local_file = "rocket_money_data.csv"
-    downloads_dir = os.path.join(os.path.expanduser("~"), "Downloads")
+    downloads_dir = get_download_dir()
     
     for attempt in range(max_retries):
         driver = None
+        tracker = None
         try:
             log(f"Download attempt {attempt + 1}/{max_retries}")
             
-            # Get list of existing transaction files before download
-            before_files = set(glob.glob(os.path.join(downloads_dir, "*-transactions.csv")))
-            log(f"Found {len(before_files)} existing transaction files")
-            for f in before_files:
-                log(f"  - {f}")
+            if direct and session is not None:
+                try:
+                    # A session whose browser was already quit has left its
+                    # cookies in the HTTP session. The export is hashed and
+                    # parsed as it streams to disk.
+                    cookie_driver = session.driver if session.running else None
+                    ingester = CSVIngester(local_file)
+                    file_name = download_with_browser_cookies(cookie_driver, download_link, local_file,
+                                                              on_chunk=ingester.feed)
+                    return ingester.finish(), file_name
+                except DirectDownloadUnavailable as e:
+                    log(f"{str(e)}, falling back to browser download")
+                    direct = False
             
-            # Configure Chrome with session persistence
-            options = get_chrome_options()
+            # Start watching the download directory before the download can begin
+            tracker = DownloadTracker(downloads_dir)
+            tracker.start()
             
-            log("Initializing Chrome driver for download...")
-            driver = uc.Chrome(options=options)
-            wait = WebDriverWait(driver, 20)
+            if session is not None:
+                log("Reusing existing Chrome session for download...")
+                driver = session.driver
+                wait = session.wait
+            else:
+                # Configure Chrome with session persistence
+                options = get_chrome_options()
+                
+                log("Initializing Chrome driver for download...")
+                driver = uc.Chrome(options=options)
+                configure_driver(driver)
+                wait = WebDriverWait(driver, 20)
             
             # First get the download page
             log("Fetching download page...")
@@ -131,8 +247,6 @@ def download_and_save_to_drive(download_link, max_retries=3):
                                     log("Empty code entered, please try again...")
                             except KeyboardInterrupt:
                                 log("2FA input interrupted, retrying...")
-                                if driver:
-                                    driver.quit()
                                 raise KeyboardInterrupt
                         
                         log("2FA code received, submitting...")
@@ -172,90 +286,21 @@ def download_and_save_to_drive(download_link, max_retries=3):
                     log("No 2FA required, continuing...")
                 except Exception as e:
                     log(f"Error during 2FA process: {str(e)}", "error")
-                    if driver:
-                        driver.quit()
+                    if session is not None:
+                        # Start the next attempt from a fresh browser
+                        session.quit()
+                        driver = None
                     continue
-                
-                # Wait for redirect to download page
-                time.sleep(3)
             
-            # Now we should be on the download page
-            log("Waiting for new file to appear in Downloads...")
+            # Now we should be on the download page; the tracker returns as
+            # soon as Chrome renames the finished download into place
+            log(f"Waiting for new file to appear in {downloads_dir}...")
+            download = tracker.wait(timeout=60)
+            new_file = download.path
             
-            # Wait for a new file to appear
-            start_time = time.time()
-            new_file = None
-            while time.time() - start_time < 60:  # Wait up to 60 seconds
-                current_files = set(glob.glob(os.path.join(downloads_dir, "*-transactions.csv")))
-                new_files = current_files - before_files
-                if new_files:
-                    # Get the most recent file from the new files
-                    new_file = max(new_files, key=os.path.getctime)
-                    log(f"Found new CSV file: {new_file}")
-                    time.sleep(2)  # Wait a bit to ensure file is completely written
-                    break
-                time.sleep(1)
-                if (time.time() - start_time) % 10 == 0:  # Log every 10 seconds
-                    log(f"Still waiting for new file... ({int(time.time() - start_time)} seconds elapsed)")
-            
-            if not new_file:
-                raise TimeoutException("Timeout waiting for file to download")
-            
-            # Copy file to working directory
-            shutil.copy2(new_file, local_file)
-            log(f"Copied file from Downloads to working directory: {local_file}")
-            
-            # Verify the downloaded file
-            log("Verifying downloaded CSV file...")
-            verify_csv_file(local_file)
-            
-            # Read and log the first few lines of the CSV
-            with open(local_file, 'r') as f:
-                header = f.readline().strip()
-                log(f"CSV Header: {header}")
-                # Read next 2 lines as sample data
-                sample_lines = [f.readline().strip() for _ in range(2)]
-                log("Sample data rows:")
-                for line in sample_lines:
-                    if line:  # Only log if line is not empty
-                        log(line)
-            
-            # Upload to Google Drive
-            try:
-                SCOPES = ['https://www.googleapis.com/auth/drive.file']
-                creds = service_account.Credentials.from_service_account_file(
-                    'credentials.json', scopes=SCOPES)
-                
-                drive_service = build('drive', 'v3', credentials=creds)
-                
-                file_metadata = {
-                    'name': os.path.basename(new_file),  # Use original filename
-                    'parents': [DRIVE_FOLDER_ID]
-                }
-                
-                media = MediaFileUpload(local_file, mimetype='text/csv', resumable=True)
-                file = drive_service.files().create(body=file_metadata,
-                                                  media_body=media,
-                                                  fields='id').execute()
-                
-                log(f"File uploaded to Google Drive with ID: {file.get('id')}")
-                
-                # Verify the file was uploaded to the correct folder
-                file_info = drive_service.files().get(
-                    fileId=file.get('id'),
-                    fields='parents'
-                ).execute()
-                
-                if DRIVE_FOLDER_ID in file_info.get('parents', []):
-                    log("File confirmed to be in the correct Drive folder")
-                else:
-                    log("Warning: File may not be in the expected Drive folder", "error")
-                
-                return local_file
-                
-            except Exception as e:
-                log(f"Error uploading to Google Drive: {str(e)}", "error")
-                raise
+            # Copy file to working directory, validating, hashing and parsing
+            # it on the way; a broken download is retried here
+            return ingest_csv(new_file, local_file), os.path.basename(new_file)
                 
         except KeyboardInterrupt:
             log("Process interrupted by user, retrying...")
@@ -274,7 +319,12 @@ def download_and_save_to_drive(download_link, max_retries=3):
             if attempt == max_retries - 1:
                 raise
         finally:
-            if driver:
+            if tracker:
+                tracker.close()
+            if session is not None:
+                if driver and not session.is_alive():
+                    session.quit()
+            elif driver:
                 try:
                     driver.quit()
                 except:
@@ -282,3 +332,23 @@ def download_and_save_to_drive(download_link, max_retries=3):
     
     raise Exception("Failed to download file after all retries")
 
+
+def download_and_save_to_drive(download_link, max_retries=3, session=None, direct=True,
+                               local_file="rocket_money_data.csv"):
+    """Download file with retry logic and verification, then upload to Google Drive.
+    
+    Args:
+        download_link: URL to download the file from
+        max_retries: Maximum number of retry attempts (default: 3)
+        session: Optional BrowserSession to borrow (see download_export)
+        direct: Try the cookie-based HTTP download first (default: True)
+        local_file: Path to save the CSV to (default: rocket_money_data.csv)
+        
+    Returns:
+        str: Path to the local file
+        
+    Raises:
+        Exception: If download fails after all retries
+    """
+    ingested, drive_file_name = download_export(download_link, max_retries, session, direct, local_file)
+    return save_to_drive(ingested, drive_file_name)
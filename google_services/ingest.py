@@ -0,0 +1,233 @@
+"""Read exported CSVs into rows to append, skipping keys already in the sheet.
+
+Two engines produce the same result:
+
+- the row engine walks each CSV with csv.reader, one row at a time;
+- the columnar engine loads each CSV in one pass with pandas (optional
+  dependency) and does the cleaning, Amount conversion and duplicate check
+  as column operations.
+
+load_new_rows() picks the columnar engine for large inputs when pandas is
+installed. Inputs can be paths or IngestedCSV handles; the row engine uses
+a handle's already parsed rows instead of reading the file again. Exports
+too large for ingest_csv() to keep their rows go to the columnar engine.
+"""
+
+import os
+import warnings
+from collections import namedtuple
+from utils.csv_ingest import MAX_PARSED_BYTES, csv_rows, csv_path, is_parsed
+from utils.logger import log
+
+
+# Rows to append with their composite keys, the number of duplicates
+# skipped and the header of the last CSV read
+NewRows = namedtuple("NewRows", ["rows", "keys", "duplicates", "header"])
+
+# Total CSV size from which "auto" uses the columnar engine. Both engines
+# spend most of their time building the Python rows gspread sends, so pandas
+# only pays off on large exports (see benchmarks/bench_csv_ingest.py). The
+# ingest stage stops keeping rows at the same size.
+COLUMNAR_MIN_BYTES = MAX_PARSED_BYTES
+
+
+def _load_pandas():
+    """Import pandas on first use, returning None if it is not installed."""
+    try:
+        import pandas
+    except ImportError:
+        return None
+    return pandas
+
+
+def read_new_rows(file_paths, existing_keys, loop_log):
+    """Row engine: read CSVs row by row and keep rows with unseen keys.
+
+    Args:
+        file_paths: CSV paths or IngestedCSV handles to read, in order
+        existing_keys: Set of (Date, Amount, Description) keys already in the
+            sheet; keys of returned rows are added to it
+        loop_log: LoopLog receiving per-row events
+
+    Returns:
+        NewRows: Rows to append (Amount as float where valid) and their keys
+    """
+    new_rows = []
+    new_keys = []
+    duplicate_count = 0
+    csv_header = None
+    for csv_file in file_paths:
+        log(f"Reading new transactions from {csv_path(csv_file)}")
+        with csv_rows(csv_file) as (csv_header, csv_reader):
+
+            # Find indices in CSV data
+            csv_date_idx = csv_header.index("Date")
+            csv_amount_idx = csv_header.index("Amount")
+            csv_desc_idx = csv_header.index("Description")
+
+            # Process each row
+            for row in csv_reader:
+                # Skip empty rows
+                if not row or all(cell.strip() == '' for cell in row):
+                    loop_log.record("empty rows skipped")
+                    continue
+
+                # Ensure row has enough elements for our key fields
+                if len(row) <= max(csv_date_idx, csv_amount_idx, csv_desc_idx):
+                    loop_log.record("incomplete rows skipped", f"Skipping incomplete row: {row}", "error")
+                    continue
+
+                # Skip rows where key fields are empty
+                if not row[csv_date_idx] or not row[csv_amount_idx] or not row[csv_desc_idx]:
+                    loop_log.record("rows with empty key fields skipped", f"Skipping row with empty key fields: {row}", "error")
+                    continue
+
+                # Create composite key for new row using original values
+                new_key = (row[csv_date_idx], row[csv_amount_idx], row[csv_desc_idx])
+
+                if new_key not in existing_keys:
+                    # Format row based on column types, preserving original strings
+                    formatted_row = []
+                    for i, (value, col_name) in enumerate(zip(row, csv_header)):
+                        if col_name == "Amount":
+                            try:
+                                # Convert amount to float for proper numeric handling
+                                formatted_row.append(float(value))
+                            except ValueError:
+                                loop_log.record("invalid amounts", f"Warning: Invalid amount value: {value}", "error")
+                                formatted_row.append(value)
+                        else:
+                            # Keep original string values for all other fields
+                            formatted_row.append(value)
+
+                    # Make sure the formatted row isn't empty
+                    if formatted_row and any(cell for cell in formatted_row):
+                        new_rows.append(formatted_row)
+                        new_keys.append(new_key)
+                        existing_keys.add(new_key)  # Add to existing keys to prevent duplicates within new data
+                        loop_log.record("new", f"New transaction found: Date={new_key[0]}, Amount={new_key[1]}, Description={new_key[2]}")
+                else:
+                    duplicate_count += 1
+                    loop_log.record("duplicates", f"Skipping duplicate transaction: Date={new_key[0]}, Amount={new_key[1]}, Description={new_key[2]}")
+
+    return NewRows(new_rows, new_keys, duplicate_count, csv_header)
+
+
+def read_new_rows_columnar(file_paths, existing_keys, loop_log):
+    """Columnar engine: same result as read_new_rows(), using pandas.
+
+    Each CSV is loaded in one pass as strings. Blank rows and rows with empty
+    key fields are dropped with column masks, keys already in the sheet (or
+    repeated within the new data) are removed with one anti-join, and Amount
+    is converted to float for the whole column. Rows with more fields than
+    the header raise a ParserError, or, when the first data row is the long
+    one, a ParserWarning as pandas would cut it down to the header width;
+    the warning is raised as an error here, so in both cases load_new_rows()
+    falls back to read_new_rows().
+
+    One difference remains: a literal "NaN" Amount is kept as the string
+    "NaN", since to_numeric() cannot tell it from an invalid value, while
+    the row engine converts it to float nan.
+
+    Args:
+        file_paths: CSV paths or IngestedCSV handles to read, in order (a
+            handle's file is read again by pandas)
+        existing_keys: Set of (Date, Amount, Description) keys already in the
+            sheet; keys of returned rows are added to it
+        loop_log: LoopLog receiving event counts
+
+    Returns:
+        NewRows: Rows to append (Amount as float where valid) and their keys
+    """
+    pd = _load_pandas()
+    new_rows = []
+    new_keys = []
+    duplicate_count = 0
+    csv_header = None
+    for csv_file in file_paths:
+        path = csv_path(csv_file)
+        log(f"Reading new transactions from {path} (columnar)")
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", pd.errors.ParserWarning)
+            frame = pd.read_csv(path, dtype=object, index_col=False, keep_default_na=False,
+                                na_filter=False, skip_blank_lines=False)
+        csv_header = list(frame.columns)
+        key_columns = ["Date", "Amount", "Description"]
+        # Short rows are padded with NaN; other columns are filled once
+        # the frame has been filtered
+        frame[key_columns] = frame[key_columns].fillna("")
+
+        # Skip empty rows, checking every column only where Date is blank
+        blank = frame["Date"].str.strip() == ""
+        if blank.any():
+            blank[blank] = frame[blank].fillna("").apply(lambda column: column.str.strip() == "").all(axis=1)
+        loop_log.add("empty rows skipped", int(blank.sum()))
+        frame = frame[~blank]
+
+        # Skip rows where key fields are empty
+        missing_key = (frame["Date"] == "") | (frame["Amount"] == "") | (frame["Description"] == "")
+        loop_log.add("rows with empty key fields skipped", int(missing_key.sum()),
+                     f"Skipping {int(missing_key.sum())} rows with empty key fields", "error")
+        frame = frame[~missing_key]
+
+        # Anti-join the composite keys against the sheet (a set lookup beats
+        # Series.isin on tuples), then drop repeats within the new data,
+        # keeping the first occurrence
+        keys = list(zip(frame["Date"], frame["Amount"], frame["Description"]))
+        in_sheet = pd.Series([key in existing_keys for key in keys], index=frame.index)
+        duplicate = in_sheet | frame.duplicated(subset=key_columns, keep="first")
+        duplicate_count += int(duplicate.sum())
+        loop_log.add("duplicates", int(duplicate.sum()))
+        frame = frame[~duplicate].fillna("")
+        kept_keys = [key for key, skip in zip(keys, duplicate) if not skip]
+
+        # Convert Amount to float across the column, keeping invalid strings
+        amounts = pd.to_numeric(frame["Amount"], errors="coerce").astype(float)
+        invalid = amounts.isna()
+        if invalid.any():
+            loop_log.add("invalid amounts", int(invalid.sum()),
+                         f"Warning: {int(invalid.sum())} invalid amount values, e.g. {frame['Amount'][invalid].iloc[0]}",
+                         "error")
+        frame["Amount"] = amounts.astype(object).where(~invalid, frame["Amount"])
+
+        new_rows.extend(frame.values.tolist())
+        new_keys.extend(kept_keys)
+        existing_keys.update(kept_keys)
+        loop_log.add("new", len(kept_keys))
+
+    return NewRows(new_rows, new_keys, duplicate_count, csv_header)
+
+
+def load_new_rows(file_paths, existing_keys, loop_log, engine="auto"):
+    """Read CSVs into rows to append with the chosen ingestion engine.
+
+    Args:
+        file_paths: CSV paths or IngestedCSV handles to read, in order
+        existing_keys: Set of keys already in the sheet (updated in place)
+        loop_log: LoopLog receiving per-row events or counts
+        engine: "rows", "columnar", or "auto" to use the columnar engine when
+            pandas is installed, some input was not parsed by ingest_csv()
+            and the inputs total at least COLUMNAR_MIN_BYTES (default: "auto")
+
+    Returns:
+        NewRows: Rows to append and their keys
+    """
+    if engine == "auto":
+        parsed = all(is_parsed(csv_file) for csv_file in file_paths)
+        total_size = sum(os.path.getsize(csv_path(csv_file)) for csv_file in file_paths)
+        engine = "columnar" if not parsed and total_size >= COLUMNAR_MIN_BYTES and _load_pandas() else "rows"
+    if engine == "columnar":
+        if _load_pandas() is None:
+            log("pandas is not installed, using the row-by-row CSV reader", "error")
+        else:
+            # Undo keys and counts from files read before a failure, so the
+            # row engine starts from the same state
+            keys_before = set(existing_keys)
+            try:
+                return read_new_rows_columnar(file_paths, existing_keys, loop_log)
+            except Exception as e:
+                log(f"Columnar CSV read failed, using the row-by-row reader: {str(e)}", "error")
+                existing_keys.clear()
+                existing_keys.update(keys_before)
+                loop_log.counts.clear()
+    return read_new_rows(file_paths, existing_keys, loop_log)
@@ -0,0 +1,132 @@
+"""Local SQLite index of the transaction keys already in the Google Sheet."""
+
+import hashlib
+import sqlite3
+from utils.logger import log
+
+
+DEFAULT_INDEX_FILE = "sheet_keys.sqlite3"
+
+
+def row_fingerprint(row):
+    """Hash a sheet row, ignoring trailing empty cells the API may omit.
+
+    Args:
+        row: List of cell values
+
+    Returns:
+        str: Hex digest of the row
+    """
+    cells = [str(cell) for cell in row]
+    while cells and cells[-1] == "":
+        cells.pop()
+    return hashlib.sha1("\x1f".join(cells).encode("utf-8")).hexdigest()
+
+
+class SheetKeyIndex:
+    """(Date, Amount, Description) keys of a sheet, persisted between runs.
+
+    Alongside the keys the index stores how many rows the sheet had and a
+    fingerprint of the key columns of its last row. If the sheet's row at
+    that position still matches and nothing follows it, the index is current
+    and the sheet does not need to be downloaded.
+    """
+
+    def __init__(self, sheet, path=DEFAULT_INDEX_FILE):
+        """Open (or create) the index.
+
+        Args:
+            sheet: Identifier of the indexed sheet; an index built for a
+                different sheet is treated as out of date
+            path: SQLite database file (default: sheet_keys.sqlite3)
+        """
+        self.sheet = sheet
+        self.path = path
+        # The sheet may be read on a worker thread and appended on the main one
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS keys ("
+            "date TEXT, amount TEXT, description TEXT, "
+            "PRIMARY KEY (date, amount, description))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+
+    def _get_meta(self, name):
+        """Read a metadata value, None if unset."""
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        """Write a metadata value (the caller commits)."""
+        self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, str(value)))
+
+    @property
+    def row_count(self):
+        """Number of sheet rows (header included) the index was built for, 0 if none."""
+        if self._get_meta("sheet") != self.sheet:
+            return 0
+        return int(self._get_meta("row_count") or 0)
+
+    def is_current(self, tail_rows):
+        """Check the index against the sheet's rows at row_count and row_count + 1.
+
+        Args:
+            tail_rows: Key columns (Date, Amount, Description) of those two
+                rows, trailing empty rows omitted
+
+        Returns:
+            bool: True if the last indexed row is unchanged and nothing follows it
+        """
+        if not self.row_count or not tail_rows:
+            return False
+        if len(tail_rows) > 1 and any(cell for cell in tail_rows[1]):
+            return False
+        return row_fingerprint(tail_rows[0]) == self._get_meta("fingerprint")
+
+    def keys(self):
+        """Load every indexed key.
+
+        Returns:
+            set: (Date, Amount, Description) tuples
+        """
+        return set(self._db.execute("SELECT date, amount, description FROM keys"))
+
+    def rebuild(self, keys, row_count, last_row):
+        """Replace the index with keys read from the full sheet.
+
+        Args:
+            keys: Iterable of (Date, Amount, Description) tuples
+            row_count: Number of rows in the sheet, header included
+            last_row: Key columns of the sheet's last row
+        """
+        with self._db:
+            self._db.execute("DELETE FROM keys")
+            self._db.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?, ?)", keys)
+            self._set_meta("sheet", self.sheet)
+            self._set_meta("row_count", row_count)
+            self._set_meta("fingerprint", row_fingerprint(last_row))
+        log(f"Rebuilt local key index with {row_count} sheet rows")
+
+    def record_append(self, keys, row_count, last_row):
+        """Add keys just appended to the sheet and move the sync point.
+
+        Args:
+            keys: Iterable of (Date, Amount, Description) tuples appended
+            row_count: Number of rows in the sheet after the append
+            last_row: Key columns of the sheet's new last row
+        """
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO keys VALUES (?, ?, ?)", keys)
+            self._set_meta("sheet", self.sheet)
+            self._set_meta("row_count", row_count)
+            self._set_meta("fingerprint", row_fingerprint(last_row))
+
+    def invalidate(self):
+        """Force a full rebuild on the next run."""
+        with self._db:
+            self._set_meta("row_count", 0)
+
+    def close(self):
+        """Close the database connection."""
+        self._db.close()
@@ -1,142 +1,399 @@
 """Google Sheets operations for appending transaction data."""
 
+import os
 import time
-import csv
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import threading
+from itertools import zip_longest
+from collections import namedtuple
 from config import SHEET_ID, SHEET_NAME
-from utils.logger import log
+from google_services.clients import get_gspread_client
+from google_services.key_index import SheetKeyIndex
+from google_services.write_scheduler import SheetsWriteScheduler, plan_batches, last_row_number
+from google_services.append_journal import AppendJournal
+from google_services.ingest import load_new_rows
+from utils.csv_ingest import IngestedCSV, csv_rows, csv_path, file_md5
+from utils.rate_limit import backoff_delay
+from utils.logger import log, LoopLog
 
 
-def append_to_google_sheets(file_path, max_retries=3):
+# Worksheet handle with its header row (None if the sheet is empty), the
+# composite keys already present and the local index they came from
+SheetSnapshot = namedtuple("SheetSnapshot", ["worksheet", "header", "keys", "index"])
+
+_key_index = None
+_key_index_lock = threading.Lock()
+
+
+def get_key_index():
+    """Return the process-wide SheetKeyIndex of the target sheet, opening it on first use.
+    
+    Every read_sheet() call, including background reads and the retries of
+    append_to_google_sheets(), shares this one SQLite connection instead of
+    opening another.
+    
+    Returns:
+        SheetKeyIndex: Index of SHEET_NAME in SHEET_ID
+    """
+    global _key_index
+    with _key_index_lock:
+        if _key_index is None:
+            _key_index = SheetKeyIndex(f"{SHEET_ID}/{SHEET_NAME}")
+        return _key_index
+
+
+def close_key_index():
+    """Close the shared SheetKeyIndex, if one was opened."""
+    global _key_index
+    with _key_index_lock:
+        if _key_index is not None:
+            _key_index.close()
+            _key_index = None
+
+
+def open_worksheet():
+    """Open the target worksheet with the shared gspread client.
+    
+    Returns:
+        gspread.Worksheet: The SHEET_NAME worksheet of SHEET_ID
+    """
+    client = get_gspread_client()
+    
+    # Open specific spreadsheet and worksheet
+    spreadsheet = client.open_by_key(SHEET_ID)
+    return spreadsheet.worksheet(SHEET_NAME)
+
+
+def key_indices(header):
+    """Find the composite key columns in a header row.
+    
+    Args:
+        header: Header row values
+        
+    Returns:
+        tuple: Indices of the Date, Amount and Description columns
+    """
+    try:
+        return header.index("Date"), header.index("Amount"), header.index("Description")
+    except ValueError as e:
+        log(f"Error finding required columns: {str(e)}", "error")
+        raise
+
+
+def column_letter(index):
+    """Convert a 0-based column index to its A1 letter (0 -> A, 26 -> AA)."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def project_row(row, indices):
+    """Pick the key columns out of a full row, padding missing cells.
+    
+    Args:
+        row: Row values
+        indices: Column indices to keep
+        
+    Returns:
+        tuple: Values at indices, "" where the row is shorter
+    """
+    return tuple(row[i] if i < len(row) else "" for i in indices)
+
+
+def read_key_columns(worksheet, indices):
+    """Fetch only the key columns below the header in a single batch_get.
+    
+    Args:
+        worksheet: gspread.Worksheet to read
+        indices: Indices of the Date, Amount and Description columns
+        
+    Returns:
+        tuple: (list of (Date, Amount, Description) tuples in row order,
+            number of sheet rows covered including the header)
+    """
+    ranges = [f"{column_letter(i)}2:{column_letter(i)}" for i in indices]
+    columns = [
+        [cells[0] if cells else "" for cells in column]
+        for column in worksheet.batch_get(ranges)
+    ]
+    key_rows = list(zip_longest(*columns, fillvalue=""))
+    return key_rows, len(key_rows) + 1
+
+
+def read_sheet(index=None, journal=None):
+    """Open the worksheet and load its header and existing composite keys.
+    
+    An append left unfinished by an earlier run or attempt is completed first
+    from its journal (see resume_pending_append()).
+    
+    The keys come from the local SheetKeyIndex when it is still in sync with
+    the sheet, checked by reading only the header and the two rows around the
+    indexed row count. Otherwise only the Date, Amount and Description columns
+    are read, in one batch_get, and the index is rebuilt from them.
+    
+    Can run on a worker thread while the export is still in progress; pass
+    the result to append_to_google_sheets() to skip the read there.
+    
+    Args:
+        index: Optional SheetKeyIndex (default: the shared one from
+            get_key_index())
+        journal: Optional AppendJournal (default: the one in
+            sheet_append_journal.jsonl)
+        
+    Returns:
+        SheetSnapshot: Worksheet, header, existing keys and index
+    """
+    worksheet = open_worksheet()
+    index = index or get_key_index()
+    resume_pending_append(worksheet, index, journal or AppendJournal())
+    
+    row_count = index.row_count
+    tail_rows = []
+    if row_count:
+        header_rows, tail_rows = worksheet.batch_get(["1:1", f"{row_count}:{row_count + 1}"])
+    else:
+        header_rows = worksheet.batch_get(["1:1"])[0]
+    if not header_rows or not any(header_rows[0]):
+        return SheetSnapshot(worksheet, None, set(), index)
+    
+    header = header_rows[0]
+    # Find indices for our composite key columns
+    indices = key_indices(header)
+    
+    if row_count:
+        if index.is_current([project_row(row, indices) for row in tail_rows]):
+            existing_keys = index.keys()
+            log(f"Local key index is in sync ({row_count} rows), found {len(existing_keys)} existing transactions")
+            return SheetSnapshot(worksheet, header, existing_keys, index)
+        log("Local key index is out of date, rebuilding from the sheet")
+    
+    log("Fetching Date, Amount and Description columns from Google Sheets...")
+    key_rows, row_count = read_key_columns(worksheet, indices)
+    
+    # Create set of existing composite keys, only from rows with valid data
+    existing_keys = {key for key in key_rows if all(key)}
+    index.rebuild(existing_keys, row_count, key_rows[-1] if key_rows else project_row(header, indices))
+    log(f"Found {len(existing_keys)} existing transactions")
+    return SheetSnapshot(worksheet, header, existing_keys, index)
+
+
+def fit_rows(rows, length):
+    """Pad shorter rows with empty strings and truncate longer ones, in place.
+    
+    Args:
+        rows: Rows to fit
+        length: Number of cells each row should have
+    """
+    for i in range(len(rows)):
+        if len(rows[i]) < length:
+            # Pad shorter rows with empty strings
+            rows[i].extend([''] * (length - len(rows[i])))
+        elif len(rows[i]) > length:
+            # Truncate longer rows
+            rows[i] = rows[i][:length]
+
+
+def journal_sources(file_paths):
+    """Describe the source CSVs of an append for its journal.
+    
+    Args:
+        file_paths: CSV paths or IngestedCSV handles, in read order
+        
+    Returns:
+        list: {"path", "md5"} of each CSV
+    """
+    return [
+        {"path": csv_path(csv_file),
+         "md5": csv_file.md5 if isinstance(csv_file, IngestedCSV) else file_md5(csv_file)}
+        for csv_file in file_paths
+    ]
+
+
+def rebuild_batches(journal):
+    """Re-derive the rows of the journal's batches from its source CSVs.
+    
+    The sources are read again only if they still have the checksums the
+    journal recorded, and each batch's rows are looked up by their keys,
+    formatted as the original append sent them.
+    
+    Args:
+        journal: Loaded AppendJournal
+        
+    Returns:
+        list: Rows of each journaled batch, or None if a source is missing,
+            changed or no longer holds a journaled key
+    """
+    for source in journal.sources:
+        if not os.path.exists(source["path"]) or file_md5(source["path"]) != source["md5"]:
+            log(f"Source CSV {source['path']} changed since the interrupted append", "error")
+            return None
+    
+    new_rows, new_keys, _, csv_header = load_new_rows(
+        [source["path"] for source in journal.sources], set(), LoopLog("Journal resume"))
+    fit_rows(new_rows, len(csv_header))
+    rows_by_key = dict(zip(new_keys, new_rows))
+    try:
+        return [[rows_by_key[tuple(key)] for key in batch["keys"]] for batch in journal.batches]
+    except KeyError:
+        log("Source CSVs no longer hold every journaled row", "error")
+        return None
+
+
+def write_journaled(worksheet, index, journal, batches):
+    """Send the journal's pending batches, then fold the append into the key index.
+    
+    Each batch is marked committed in the journal as soon as it is written,
+    and the journal is cleared once the index has recorded every key.
+    
+    Args:
+        worksheet: gspread.Worksheet to append to
+        index: SheetKeyIndex of the worksheet
+        journal: AppendJournal started for this append
+        batches: Rows of every journaled batch, in journal order
+    """
+    pending = journal.pending
+    pending_rows = [rows for batch, rows in zip(journal.batches, batches) if batch["end_row"] is None]
+    
+    def commit(number, response):
+        journal.commit(pending[number]["id"], last_row_number(response))
+    
+    # A batch whose request failed mid-flight is only resent once the rows
+    # it should have landed on are read back empty. Date and Description are
+    # compared because Sheets keeps them as sent, unlike the Amount number.
+    date_idx, _, desc_idx = key_indices(journal.header)
+    scheduler = SheetsWriteScheduler(worksheet, row_key=lambda row: project_row(row, (date_idx, desc_idx)))
+    
+    # The last batch echoes its values back as the sheet formats them, so the
+    # index can fingerprint the new last row
+    response = scheduler.append_batches(
+        pending_rows,
+        value_input_option='USER_ENTERED',
+        include_values_in_response=True,
+        on_batch=commit,
+        start_row=journal.last_row + 1
+    )
+    
+    written = response.get("updates", {}).get("updatedData", {}).get("values", [])
+    end_row = journal.last_row
+    if not written:
+        # Every batch was committed before, read the last one back instead
+        written = worksheet.batch_get([f"{end_row}:{end_row}"])[0]
+    if written:
+        index.record_append(journal.keys(), end_row, project_row(written[-1], key_indices(journal.header)))
+    else:
+        index.invalidate()
+    journal.clear()
+
+
+def resume_pending_append(worksheet, index, journal):
+    """Finish an append that a crash or failed attempt left half done.
+    
+    Only the uncommitted batches are sent, their rows re-derived from the
+    journal's source CSVs. The sheet is not read beyond the two rows around
+    the last committed batch, which confirm that nothing was written after
+    the journal's last record. If anything does not line up,
+    the journal is discarded and the index invalidated, so the next read
+    rebuilds it and the composite-key dedupe skips rows already written.
+    
+    Args:
+        worksheet: gspread.Worksheet the journal was written for
+        index: SheetKeyIndex of the worksheet
+        journal: AppendJournal to resume
+        
+    Returns:
+        bool: True if an interrupted append was completed
+    """
+    if not journal.load():
+        return False
+    if journal.sheet != index.sheet or index.row_count != journal.base_row_count:
+        log("Append journal does not match the local key index, discarding it", "error")
+        journal.clear()
+        index.invalidate()
+        return False
+    
+    end_row = journal.last_row
+    tail_rows = worksheet.batch_get([f"{end_row}:{end_row + 1}"])[0]
+    if not tail_rows or (len(tail_rows) > 1 and any(tail_rows[1])):
+        log("Sheet changed after the interrupted append, discarding its journal", "error")
+        journal.clear()
+        index.invalidate()
+        return False
+    
+    batches = rebuild_batches(journal)
+    if batches is None:
+        log("Cannot re-derive the interrupted append's rows, discarding its journal", "error")
+        journal.clear()
+        index.invalidate()
+        return False
+    
+    log(f"Resuming interrupted append: {len(journal.pending)} of {len(journal.batches)} batches left")
+    write_journaled(worksheet, index, journal, batches)
+    return True
+
+
+def append_to_google_sheets(file_path, max_retries=3, snapshot=None, engine="auto"):
     """Append data to Google Sheets with duplicate prevention using composite key.
     
     Args:
-        file_path: Path to the CSV file to append
+        file_path: Path or IngestedCSV handle of the CSV to append, or a list
+            of them to append together with a single sheet read and one set
+            of writes
         max_retries: Maximum number of retry attempts (default: 3)
+        snapshot: Optional SheetSnapshot read earlier with read_sheet(), used
+            for the first attempt instead of reading the sheet again
+        engine: CSV ingestion engine - "rows", "columnar" (pandas) or "auto"
+            (default: "auto", see google_services.ingest.load_new_rows)
     """
     log("Appending data to Google Sheets...")
+    file_paths = [file_path] if isinstance(file_path, (str, IngestedCSV)) else list(file_path)
     
     for attempt in range(max_retries):
         try:
-            scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-            creds = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", scope)
-            client = gspread.authorize(creds)
-            
-            # Open specific spreadsheet and worksheet
-            spreadsheet = client.open_by_key(SHEET_ID)
-            worksheet = spreadsheet.worksheet(SHEET_NAME)
-            
-            # Get all existing values from the worksheet
-            log("Fetching existing data from Google Sheets...")
-            existing_data = worksheet.get_all_values()
-            if not existing_data:
+            if snapshot is None:
+                snapshot = read_sheet()
+            worksheet = snapshot.worksheet
+            index = snapshot.index
+            existing_keys = snapshot.keys
+            if snapshot.header is None:
                 log("Sheet is empty, initializing with header row")
                 # Read CSV header to initialize sheet
-                with open(file_path, "r", newline='') as f:
-                    csv_reader = csv.reader(f)
-                    header = next(csv_reader)  # Get header row
+                with csv_rows(file_paths[0]) as (header, _):
+                    pass
                 worksheet.append_row(header)
-                existing_data = [header]  # Update existing_data to include header
-                existing_keys = set()
+                index.rebuild([], 1, project_row(header, key_indices(header)))
             else:
-                header = existing_data[0]
-                # Find indices for our composite key columns
-                try:
-                    date_idx = header.index("Date")
-                    amount_idx = header.index("Amount")
-                    desc_idx = header.index("Description")
-                except ValueError as e:
-                    log(f"Error finding required columns: {str(e)}", "error")
-                    raise
-                
-                # Create set of existing composite keys
-                existing_keys = {
-                    (row[date_idx], row[amount_idx], row[desc_idx])
-                    for row in existing_data[1:]  # Skip header row
-                    if len(row) > max(date_idx, amount_idx, desc_idx) and row[date_idx] and row[amount_idx] and row[desc_idx]  # Only include rows with valid data
-                }
-                log(f"Found {len(existing_keys)} existing transactions")
+                header = snapshot.header
             
             # Read and process new CSV data
-            new_rows = []
-            duplicate_count = 0
-            with open(file_path, "r", newline='') as f:
-                csv_reader = csv.reader(f)
-                csv_header = next(csv_reader)  # Skip header row from CSV
-                
-                # Find indices in CSV data
-                csv_date_idx = csv_header.index("Date")
-                csv_amount_idx = csv_header.index("Amount")
-                csv_desc_idx = csv_header.index("Description")
-                
-                # Process each row
-                for row in csv_reader:
-                    # Skip empty rows
-                    if not row or all(cell.strip() == '' for cell in row):
-                        log("Skipping empty row")
-                        continue
-                        
-                    # Ensure row has enough elements for our key fields
-                    if len(row) <= max(csv_date_idx, csv_amount_idx, csv_desc_idx):
-                        log(f"Skipping incomplete row: {row}", "error")
-                        continue
-                        
-                    # Skip rows where key fields are empty
-                    if not row[csv_date_idx] or not row[csv_amount_idx] or not row[csv_desc_idx]:
-                        log(f"Skipping row with empty key fields: {row}", "error")
-                        continue
-                    
-                    # Create composite key for new row using original values
-                    new_key = (row[csv_date_idx], row[csv_amount_idx], row[csv_desc_idx])
-                    
-                    if new_key not in existing_keys:
-                        # Format row based on column types, preserving original strings
-                        formatted_row = []
-                        for i, (value, col_name) in enumerate(zip(row, csv_header)):
-                            if col_name == "Amount":
-                                try:
-                                    # Convert amount to float for proper numeric handling
-                                    formatted_row.append(float(value))
-                                except ValueError:
-                                    log(f"Warning: Invalid amount value: {value}", "error")
-                                    formatted_row.append(value)
-                            else:
-                                # Keep original string values for all other fields
-                                formatted_row.append(value)
-                        
-                        # Make sure the formatted row isn't empty
-                        if formatted_row and any(cell for cell in formatted_row):
-                            new_rows.append(formatted_row)
-                            existing_keys.add(new_key)  # Add to existing keys to prevent duplicates within new data
-                            log(f"New transaction found: Date={new_key[0]}, Amount={new_key[1]}, Description={new_key[2]}")
-                    else:
-                        duplicate_count += 1
-                        log(f"Skipping duplicate transaction: Date={new_key[0]}, Amount={new_key[1]}, Description={new_key[2]}")
+            loop_log = LoopLog("Sheets dedupe")
+            new_rows, new_keys, duplicate_count, csv_header = load_new_rows(
+                file_paths, existing_keys, loop_log, engine)
+            
+            loop_log.summary()
             
             if not new_rows:
                 log(f"No new transactions to append. Found {duplicate_count} duplicate entries.")
                 return
             
             # Ensure all rows in batch have the same length (match the header length)
-            expected_length = len(csv_header)
-            for i in range(len(new_rows)):
-                if len(new_rows[i]) < expected_length:
-                    # Pad shorter rows with empty strings
-                    new_rows[i].extend([''] * (expected_length - len(new_rows[i])))
-                elif len(new_rows[i]) > expected_length:
-                    # Truncate longer rows
-                    new_rows[i] = new_rows[i][:expected_length]
+            fit_rows(new_rows, len(csv_header))
             
             # Log the rows we're about to append
             log(f"Preparing to append {len(new_rows)} non-empty rows")
             
-            # Append in batches of 100 to avoid quota limits
-            batch_size = 100
-            for i in range(0, len(new_rows), batch_size):
-                batch = new_rows[i:i + batch_size]
-                worksheet.append_rows(batch, value_input_option='USER_ENTERED')
-                log(f"Appended batch of {len(batch)} rows")
+            # Append in as few quota-limited requests as fit, journaling each
+            # batch's keys so an interrupted append can resume where it stopped
+            batches = plan_batches(new_rows)
+            batch_keys = []
+            start = 0
+            for batch in batches:
+                batch_keys.append(new_keys[start:start + len(batch)])
+                start += len(batch)
+            journal = AppendJournal()
+            journal.start(index.sheet, index.row_count, header, journal_sources(file_paths), batch_keys)
+            write_journaled(worksheet, index, journal, batches)
             
             log(f"Successfully appended {len(new_rows)} new rows to the worksheet.")
             if duplicate_count > 0:
@@ -145,7 +402,9 @@ def append_to_google_sheets(file_path, max_retries=3):
             
         except Exception as e:
             log(f"Append attempt {attempt + 1} failed: {str(e)}", "error")
+            # On retry, read_sheet() resumes from the journal's last committed batch
+            snapshot = None
             if attempt == max_retries - 1:
                 raise
-            time.sleep(5)
+            time.sleep(backoff_delay(attempt, base=5))
 
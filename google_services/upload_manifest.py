@@ -0,0 +1,72 @@
+"""Local manifest of CSV exports already uploaded to Google Drive, by content hash."""
+
+import os
+import json
+from utils.logger import log
+
+
+DEFAULT_MANIFEST_FILE = "drive_upload_manifest.json"
+
+
+class DriveUploadManifest:
+    """MD5 checksums of uploaded files, with their Drive file ID and name.
+
+    An export whose checksum is in the manifest has been uploaded before;
+    the caller confirms it is still in the Drive folder before skipping the
+    upload, since files can be deleted on the Drive side.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST_FILE):
+        """Load the manifest from disk.
+
+        Args:
+            path: JSON file the manifest is persisted to
+        """
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.files = json.load(f).get("files", {})
+            except (OSError, ValueError, AttributeError) as e:
+                log(f"Could not read Drive upload manifest {path}, starting fresh: {str(e)}", "error")
+
+    def get(self, md5):
+        """Return the recorded upload for a checksum.
+
+        Args:
+            md5: Hex MD5 of the local file
+
+        Returns:
+            dict: {"id", "name", "folder"} of the uploaded file, or None
+        """
+        return self.files.get(md5)
+
+    def record(self, md5, file_id, name, folder):
+        """Record an upload and save.
+
+        Args:
+            md5: Hex MD5 of the uploaded file
+            file_id: Drive file ID
+            name: Drive file name
+            folder: Drive folder ID the file was uploaded to
+        """
+        self.files[md5] = {"id": file_id, "name": name, "folder": folder}
+        self._save()
+
+    def forget(self, md5):
+        """Drop a checksum whose file is no longer in Drive, and save.
+
+        Args:
+            md5: Hex MD5 to remove
+        """
+        if self.files.pop(md5, None) is not None:
+            self._save()
+
+    def _save(self):
+        """Write the manifest, logging rather than raising on failure."""
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"files": self.files}, f)
+        except OSError as e:
+            log(f"Could not save Drive upload manifest {self.path}: {str(e)}", "error")
@@ -0,0 +1,238 @@
+"""Quota-aware batching, rate limiting and retries for Google Sheets appends."""
+
+import re
+import json
+import time
+import requests
+from utils.rate_limit import TokenBucket, backoff_delay
+from utils.logger import log
+
+
+# Sheets API write quota per user per project
+WRITE_REQUESTS_PER_MINUTE = 60
+
+# Google recommends keeping request payloads under 2 MB
+MAX_BATCH_BYTES = 2 * 1024 * 1024
+
+# Shared by every scheduler in the process, since the quota is per user and
+# project rather than per worksheet
+_write_bucket = TokenBucket(WRITE_REQUESTS_PER_MINUTE, per=60)
+
+
+def _status_code(error):
+    """HTTP status of a gspread APIError (or any error with a response), else None."""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(error):
+    """Check whether a failed request is worth retrying.
+
+    Args:
+        error: Exception raised by the request
+
+    Returns:
+        bool: True for rate limiting (429), server errors (5xx) and
+            connection problems
+    """
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    status = _status_code(error)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def _retry_after(error):
+    """Seconds requested by a Retry-After header, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def last_row_number(response):
+    """Return the last row number written by a values.append response, or None."""
+    updated_range = response.get("updates", {}).get("updatedRange", "")
+    match = re.search(r"(\d+)$", updated_range)
+    return int(match.group(1)) if match else None
+
+
+def plan_batches(rows, max_batch_bytes=MAX_BATCH_BYTES):
+    """Split rows into as few batches as fit within the payload limit.
+
+    Args:
+        rows: Rows to append
+        max_batch_bytes: Maximum estimated JSON size of one batch
+
+    Returns:
+        list: Lists of rows, in order
+    """
+    batches = []
+    batch = []
+    size = 0
+    for row in rows:
+        row_size = len(json.dumps(row)) + 1
+        if batch and size + row_size > max_batch_bytes:
+            batches.append(batch)
+            batch = []
+            size = 0
+        batch.append(row)
+        size += row_size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class SheetsWriteScheduler:
+    """Append rows to a worksheet in as few requests as the limits allow.
+
+    Every request first takes a token from a bucket sized to the Sheets write
+    quota. A batch that fails is retried on its own with exponential backoff
+    and jitter (or the server's Retry-After), so earlier batches are never
+    resent. A 429 means the request was refused, so it is simply sent again.
+    After a 5xx or connection error the rows may have been written anyway, so
+    the rows the batch should have landed on are read back first: the batch
+    is resent only if they are empty, treated as written if they hold the
+    batch's keys, and given up on otherwise. Without a row_key the scheduler
+    cannot tell, and only retries 429s.
+
+    Usage:
+        scheduler = SheetsWriteScheduler(worksheet)
+        response = scheduler.append(rows)
+    """
+
+    def __init__(self, worksheet, bucket=None, max_batch_bytes=MAX_BATCH_BYTES,
+                 max_attempts=6, base_delay=1.0, max_delay=64.0, row_key=None):
+        """Configure the scheduler.
+
+        Args:
+            worksheet: gspread.Worksheet to append to
+            bucket: TokenBucket to draw from (default: the process-wide
+                Sheets write bucket)
+            max_batch_bytes: Maximum estimated payload per request (default: 2 MB)
+            max_attempts: Attempts per batch before giving up (default: 6)
+            base_delay: First backoff delay scale in seconds (default: 1)
+            max_delay: Maximum backoff delay in seconds (default: 64)
+            row_key: Optional callable(row) returning the values that identify
+                a row, applied alike to rows sent and rows read back from the
+                sheet; needed to retry after 5xx and connection errors
+        """
+        self.worksheet = worksheet
+        self.bucket = bucket or _write_bucket
+        self.max_batch_bytes = max_batch_bytes
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.row_key = row_key
+
+    def append(self, rows, value_input_option="USER_ENTERED", include_values_in_response=False,
+               start_row=None):
+        """Append rows in order.
+
+        Args:
+            rows: Rows to append
+            value_input_option: How Sheets interprets the values (default: USER_ENTERED)
+            include_values_in_response: Ask for the last batch's values to be
+                echoed back in its response (default: False)
+            start_row: Sheet row the first appended row should land on, used
+                to check a failed request before resending it (default: None)
+
+        Returns:
+            dict: Response of the last append request ({} if rows is empty)
+        """
+        batches = plan_batches(rows, self.max_batch_bytes)
+        return self.append_batches(batches, value_input_option, include_values_in_response,
+                                   start_row=start_row)
+
+    def append_batches(self, batches, value_input_option="USER_ENTERED", include_values_in_response=False,
+                       on_batch=None, start_row=None):
+        """Append pre-planned batches in order, one request each.
+
+        Args:
+            batches: Lists of rows, e.g. from plan_batches()
+            value_input_option: How Sheets interprets the values (default: USER_ENTERED)
+            include_values_in_response: Ask for the last batch's values to be
+                echoed back in its response (default: False)
+            on_batch: Optional callable(batch_number, response) run after each
+                batch is written, with batch_number counting from 0
+            start_row: Sheet row the first batch should land on, used to check
+                a failed request before resending it (default: None)
+
+        Returns:
+            dict: Response of the last append request ({} if there are no batches)
+        """
+        log(f"Appending {sum(len(batch) for batch in batches)} rows in {len(batches)} request(s)")
+        response = {}
+        for number, batch in enumerate(batches):
+            is_last = number == len(batches) - 1
+            response = self._append_batch(batch, start_row, value_input_option,
+                                          include_values_in_response and is_last)
+            log(f"Appended batch {number + 1}/{len(batches)} of {len(batch)} rows")
+            if start_row is not None:
+                start_row = (last_row_number(response) or start_row + len(batch) - 1) + 1
+            if on_batch:
+                on_batch(number, response)
+        return response
+
+    def _append_batch(self, batch, start_row, value_input_option, include_values_in_response):
+        """Send one append request, retrying it when that cannot duplicate rows."""
+        verifiable = self.row_key is not None and start_row is not None
+        unsure = False
+        for attempt in range(self.max_attempts):
+            try:
+                if unsure:
+                    # The last attempt may have been written before it failed
+                    response = self._find_written(batch, start_row, include_values_in_response)
+                    if response is not None:
+                        log("Failed Sheets append was written after all, not resending it")
+                        return response
+                    unsure = False
+                waited = self.bucket.acquire()
+                if waited >= 1:
+                    log(f"Waited {waited:.1f}s to stay within the Sheets write quota")
+                return self.worksheet.append_rows(
+                    batch,
+                    value_input_option=value_input_option,
+                    include_values_in_response=include_values_in_response,
+                )
+            except Exception as e:
+                status = _status_code(e)
+                if not is_retryable(e) or (status != 429 and not verifiable) or attempt == self.max_attempts - 1:
+                    raise
+                if status == 429:
+                    # The server-side quota is spent; stop bursting
+                    self.bucket.drain()
+                else:
+                    unsure = True
+                delay = _retry_after(e) or backoff_delay(attempt, self.base_delay, self.max_delay)
+                log(f"Sheets request failed ({str(e)}), retrying this batch in {delay:.1f}s "
+                    f"(attempt {attempt + 2}/{self.max_attempts})", "error")
+                time.sleep(delay)
+
+    def _find_written(self, batch, start_row, include_values_in_response):
+        """Read back the rows a batch should have landed on.
+
+        Args:
+            batch: Rows of the failed request
+            start_row: Sheet row the batch's first row should be on
+            include_values_in_response: Add the rows read to the response
+
+        Returns:
+            dict: Append-style response if the sheet already holds the batch,
+                None if the rows are still empty
+
+        Raises:
+            RuntimeError: If other rows are there, so resending could
+                duplicate or misplace the batch
+        """
+        end_row = start_row + len(batch) - 1
+        sheet_rows = self.worksheet.batch_get([f"{start_row}:{end_row}"])[0]
+        if not any(any(row) for row in sheet_rows):
+            return None
+        if [self.row_key(row) for row in sheet_rows] != [self.row_key(row) for row in batch]:
+            raise RuntimeError(f"Rows {start_row}-{end_row} changed after a failed append, not resending it")
+        updates = {"updatedRange": f"A{start_row}:{end_row}", "updatedRows": len(batch)}
+        if include_values_in_response:
+            updates["updatedData"] = {"values": sheet_rows}
+        return {"updates": updates}
@@ -1,49 +1,366 @@
 """Main entry point for Rocket Money automation.
 
 This script orchestrates the complete workflow:
-1. Export transactions from Rocket Money
-2. Retrieve download link from email
-3. Download and upload file to Google Drive
-4. Append data to Google Sheets
+1. Export transactions from Rocket Money (one or more queued jobs)
+2. Retrieve download link(s) from email
+3. Download the file(s)
+4. Upload them to Google Drive and append the data to Google Sheets
+
+Work that does not depend on the previous step runs on a thread pool: the
+Drive client and the current Sheets contents are loaded while the browser
+exports, the browser shuts down while the export email is awaited, and the
+Drive upload runs alongside the Sheets append.
 """
 
+import re
 import time
-from utils.logger import log
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from utils.logger import log, set_debug
 from rocket_money.export import export_rocket_money_data
+from rocket_money.session import BrowserSession
+from rocket_money.jobs import ExportJob, parse_job_spec, assign_files_to_jobs
 from email_processor.processor import get_download_link
-from google_services.drive import download_and_save_to_drive
-from google_services.sheets import append_to_google_sheets
+from email_processor.watcher import EmailWatcher
+from rocket_money.network_export import export_via_network
+from rocket_money.download import get_http_session, copy_browser_cookies
+from google_services.drive import download_export, save_to_drive, get_drive_service
+from google_services.sheets import append_to_google_sheets, read_sheet, close_key_index
+from utils.selector_cache import save_selector_cache
+
+
+# Overall budget in seconds for the export email to arrive
+EMAIL_DEADLINE = 180
 
+# Worker threads: Drive warm-up, Sheets read, email wait and browser shutdown,
+# later reused for the Drive upload and Sheets append
+MAX_WORKERS = 4
 
-def main():
-    """Main function that orchestrates the automation workflow."""
-    local_file = None
+
+def release_browser(session, executor):
+    """Hand the browser's cookies to the HTTP session and quit it in the background.
+    
+    The direct download only needs the cookies, so the browser can shut down
+    while the export email is awaited. If the direct download later falls
+    back to the browser, the session starts a new one.
+    
+    Args:
+        session: BrowserSession that ran the export
+        executor: Executor to run the shutdown on
+    """
     try:
-        # 1. Export Rocket Money Data with piano income filter
-        export_rocket_money_data()
-        log("Waiting 30 seconds for email...")
-        time.sleep(30)  # Initial wait for email
+        copy_browser_cookies(session.driver, get_http_session())
+    except Exception as e:
+        log(f"Could not copy browser cookies, keeping the browser open: {str(e)}", "error")
+        return
+    session.quit_async(executor)
+
+
+def poll_for_link(requested_at, debug_email=False):
+    """Wait a fixed time, then poll the inbox for the export email.
+    
+    Args:
+        requested_at: Unix timestamp of the export request
+        debug_email: Save the email's HTML body to email_content.html
+        
+    Returns:
+        str: Download link if found, None otherwise
+    """
+    log("Waiting 30 seconds for email...")
+    time.sleep(30)  # Initial wait for email
+    return get_download_link(since=requested_at, debug=debug_email)
+
+
+def export_and_wait_for_links(session, jobs, executor, debug_email=False):
+    """Export from Rocket Money and wait for the download link emails.
+    
+    The inbox watcher is opened before the export is clicked so each link is
+    returned as soon as its email lands. The wait runs on the executor as
+    soon as the last export is confirmed, while the browser shuts down. If
+    the watcher cannot connect, a single export falls back to the fixed wait
+    and polling in get_download_link().
+    
+    Args:
+        session: BrowserSession used for the export
+        jobs: List of ExportJob to run in one authenticated session
+        executor: Executor for the email wait and the browser shutdown
+        debug_email: Save each email's HTML body to email_content.html
+        
+    Returns:
+        list: Download links in email arrival order
+    """
+    watcher = EmailWatcher(debug=debug_email)
+    try:
+        watcher.start()
+    except Exception as e:
+        if len(jobs) > 1:
+            raise Exception(f"Batch exports need the email watcher, which could not start: {str(e)}")
+        log(f"Could not start email watcher, falling back to polling: {str(e)}", "error")
+        watcher.close()
+        watcher = None
+    
+    try:
+        # 1. Export Rocket Money Data for every job
+        requested_at = time.time()
+        export_rocket_money_data(session=session, jobs=jobs)
+        
+        # 2. Get Download Links from Email while the browser shuts down
+        if watcher:
+            deadline = EMAIL_DEADLINE * len(jobs)
+            log(f"Waiting up to {deadline} seconds for {len(jobs)} email(s)...")
+            pending = executor.submit(watcher.wait_for_links, len(jobs), timeout=deadline)
+        else:
+            pending = executor.submit(poll_for_link, requested_at, debug_email)
+        release_browser(session, executor)
+        
+        if watcher:
+            return pending.result()
+        download_link = pending.result()
+        return [download_link] if download_link else []
+    finally:
+        if watcher:
+            watcher.close()
+
+
+def parse_args():
+    """Parse command line options.
+    
+    Returns:
+        argparse.Namespace: Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Rocket Money automation")
+    parser.add_argument(
+        "--lean",
+        action="store_true",
+        help="Run Chrome headless with images, fonts, media and analytics blocked"
+    )
+    parser.add_argument(
+        "--job",
+        action="append",
+        default=[],
+        metavar="CATEGORY[=DATE_RANGE]",
+        help="Queue an export for a category and ROCKET_DATE_RANGE_MAP key; "
+             "repeat to run several exports after one login"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["email", "network"],
+        default="email",
+        help="email: request Rocket Money's emailed CSV (default); "
+             "network: capture the transactions page's API responses instead"
+    )
+    parser.add_argument(
+        "--debug-email",
+        action="store_true",
+        help="Save the export email's HTML body to email_content.html"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Log every row in per-row loops instead of a sample and a summary"
+    )
+    return parser.parse_args()
+
+
+def export_via_email(session, jobs, executor, debug_email=False):
+    """Export through Rocket Money's emailed CSV and download each file.
+    
+    Args:
+        session: Shared BrowserSession
+        jobs: List of ExportJob to export
+        executor: Executor for work overlapping the email wait
+        debug_email: Save each email's HTML body to email_content.html
         
-        # 2. Get Download Link from Email (with retries)
-        download_link = get_download_link()
-        if not download_link:
-            raise Exception("Failed to get download link after all retries")
+    Returns:
+        list: (IngestedCSV, Drive file name) of each downloaded CSV
+    """
+    exports = []
+    
+    # 1-2. Export Rocket Money Data and get the download links from email
+    download_links = export_and_wait_for_links(session, jobs, executor, debug_email=debug_email)
+    if not download_links:
+        raise Exception("Failed to get download link after all retries")
+    if len(download_links) < len(jobs):
+        log(f"Only {len(download_links)} of {len(jobs)} export emails arrived", "error")
+    
+    # 3. Download files using the links
+    for i, download_link in enumerate(download_links):
+        log(f"Starting download using link {i + 1}/{len(download_links)}...")
+        target = "rocket_money_data.csv" if len(jobs) == 1 else f"rocket_money_data_{i + 1}.csv"
+        exports.append(download_export(download_link, session=session, local_file=target))
+    
+    if len(jobs) > 1:
+        assign_files_to_jobs(jobs, [ingested for ingested, _ in exports])
+        for job in jobs:
+            log(f"Job '{job}': {job.local_file or 'no file'}")
+    return exports
+
+
+def network_export_name(job, index, job_count):
+    """Drive file name for a network export, unique within the run.
+    
+    A single export gets Rocket Money's own "YYYY-MM-DD-transactions.csv"
+    pattern; with several jobs the job number and category are added, since
+    the emailed exports of a multi-job run also arrive under distinct names.
+    
+    Args:
+        job: ExportJob that was exported
+        index: 0-based position of the job in the run
+        job_count: Number of jobs in the run
         
-        # 3. Download file using the link
-        log("Starting download using link...")
-        local_file = download_and_save_to_drive(download_link)
-        if not local_file:
-            raise Exception("Failed to download and save file")
+    Returns:
+        str: File name for Google Drive
+    """
+    date = time.strftime('%Y-%m-%d')
+    if job_count == 1:
+        return f"{date}-transactions.csv"
+    category = re.sub(r"[^A-Za-z0-9]+", "-", job.category).strip("-").lower() or "export"
+    return f"{date}-{index + 1}-{category}-transactions.csv"
+
+
+def export_via_network_capture(session, jobs, executor, sheet_ready):
+    """Export by capturing the transactions page's own API responses.
+    
+    No email round trip or file download is involved; each CSV is written
+    directly and the browser shuts down in the background. The columns are
+    checked against the sheet's header, which earlier emailed exports set.
+    
+    Args:
+        session: BrowserSession started with capture_network=True
+        jobs: List of ExportJob to export
+        executor: Executor for the browser shutdown
+        sheet_ready: Future of the background read_sheet()
         
-        # 4. Append Data to Google Sheets
-        append_to_google_sheets(local_file)
+    Returns:
+        list: (IngestedCSV, Drive file name) of each written CSV
+    """
+    exports = []
+    snapshot = result_or_none(sheet_ready, "Sheets read")
+    expected_header = snapshot.header if snapshot else None
+    for i, job in enumerate(jobs):
+        log(f"Running network export job {i + 1}/{len(jobs)}: {job}")
+        target = "rocket_money_data.csv" if len(jobs) == 1 else f"rocket_money_data_{i + 1}.csv"
+        ingested = export_via_network(session, job=job, local_file=target, expected_header=expected_header)
+        job.local_file = ingested.path
+        exports.append((ingested, network_export_name(job, i, len(jobs))))
+    
+    session.quit_async(executor)
+    return exports
+
+
+def upload_exports(exports):
+    """Upload downloaded exports to Google Drive one after another.
+    
+    The upload manifest is not thread-safe, so uploads share one worker.
+    
+    Args:
+        exports: (IngestedCSV, Drive file name) of each CSV
+    """
+    for ingested, drive_file_name in exports:
+        save_to_drive(ingested, drive_file_name)
+
+
+def upload_and_append(exports, sheet_ready, executor):
+    """Upload the exports to Drive while their rows are appended to Sheets.
+    
+    Both stages work from the already ingested CSVs, so they run side by
+    side on the executor. A failure in one does not stop the other; errors from both are
+    logged and raised together.
+    
+    Args:
+        exports: (IngestedCSV, Drive file name) of each CSV
+        sheet_ready: Future of the background read_sheet()
+        executor: Executor to run the two stages on
+        
+    Raises:
+        Exception: If either stage failed
+    """
+    csv_files = [ingested for ingested, _ in exports]
+    stages = [("Drive upload", executor.submit(upload_exports, exports))]
+    snapshot = result_or_none(sheet_ready, "Sheets read")
+    stages.append(("Sheets append", executor.submit(append_to_google_sheets, csv_files, snapshot=snapshot)))
+    
+    errors = []
+    for description, future in stages:
+        try:
+            future.result()
+        except Exception as e:
+            log(f"{description} failed: {str(e)}", "error")
+            errors.append(f"{description}: {str(e)}")
+    if errors:
+        raise Exception("; ".join(errors))
+
+
+def result_or_none(future, description):
+    """Return a warm-up future's result, or None if it failed.
+    
+    Args:
+        future: Future of a warm-up task
+        description: What the task did, for the log
+        
+    Returns:
+        The task's result, or None
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        log(f"{description} failed in the background, retrying inline: {str(e)}", "error")
+        return None
+
+
+def main(lean=False, jobs=None, engine="email", debug_email=False):
+    """Main function that orchestrates the automation workflow.
+    
+    Args:
+        lean: Run the browser in lean headless mode (default: False)
+        jobs: Optional list of ExportJob to export in one session
+            (default: a single Piano Income export)
+        engine: "email" to use Rocket Money's emailed CSV, or "network" to
+            capture the transactions page's API responses, falling back to
+            email if the capture fails (default: "email")
+        debug_email: Save the export email's HTML body to email_content.html
+            (default: False)
+    """
+    jobs = jobs or [ExportJob()]
+    exports = []
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            # Load the Google clients and the current sheet while the browser works
+            executor.submit(get_drive_service)
+            sheet_ready = executor.submit(read_sheet)
+            
+            # One browser session is shared by the exports and the downloads so
+            # Chrome starts (and logs in) only once per run
+            session = BrowserSession(lean=lean, capture_network=engine == "network")
+            try:
+                if engine == "network":
+                    try:
+                        exports = export_via_network_capture(session, jobs, executor, sheet_ready)
+                    except Exception as e:
+                        log(f"Network export failed, falling back to email export: {str(e)}", "error")
+                if not exports:
+                    exports = export_via_email(session, jobs, executor, debug_email=debug_email)
+            finally:
+                session.quit_async(executor)
+            
+            # 4. Upload to Google Drive and append to Google Sheets in one batch
+            upload_and_append(exports, sheet_ready, executor)
         
     except Exception as e:
         log(f"Automation failed: {str(e)}", "error")
         raise
     finally:
+        save_selector_cache()
+        close_key_index()
         log("Script completed. Local files have been preserved for debugging.")
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    set_debug(args.verbose)
+    main(
+        lean=args.lean,
+        jobs=[parse_job_spec(spec) for spec in args.job],
+        engine=args.engine,
+        debug_email=args.debug_email
+    )
@@ -7,12 +7,10 @@ from typing import Dict, List, Any, Optional
 import config
 from config import SHEET_ID, SHEET_NAME_MONARCH
 from monarchmoney import MonarchMoney, RequireMFAException
-from utils.logger import log
+from utils.logger import log, LoopLog
 
-from google.oauth2.credentials import Credentials
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_services.clients import get_service
 
 
 OUTPUT_CSV = "monarch_piano_income.csv"
@@ -167,21 +165,14 @@ def write_csv(transactions: List[Dict[str, Any]]) -> None:
 
 
 def get_sheets_service():
-    """Create and return Google Sheets API service."""
+    """Return the shared Google Sheets API service."""
     try:
-        creds = service_account.Credentials.from_service_account_file(
-            'credentials.json',
-            scopes=['https://www.googleapis.com/auth/spreadsheets']
-        )
-        log("Using service account credentials from credentials.json.")
-    except Exception as e:
+        return get_service('sheets', 'v4')
+    except (OSError, ValueError) as e:
         raise SystemExit(
             f"Could not load Google credentials from 'credentials.json'. "
             f"Please ensure the file exists and is valid. Error: {e}"
         )
-    
-    service = build('sheets', 'v4', credentials=creds)
-    return service
 
 
 def get_existing_rows(service) -> List[List[str]]:
@@ -287,11 +278,11 @@ def sync_to_google_sheets() -> None:
             new_rows.append(row)
 
     log(f"Identified {len(new_rows)} new transactions to append.")
-    if new_rows: ##
-        log("New transaction keys:")
+    if new_rows:
+        loop_log = LoopLog("Monarch sync")
         for row in new_rows:
-            key = create_row_key(row)
-            log(f"New key: {key} -> {row}") ##
+            loop_log.record("new keys", f"New key: {create_row_key(row)} -> {row}")
+        loop_log.summary()
 
     # Append new rows
     append_to_sheet(service, new_rows)
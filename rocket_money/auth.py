@@ -5,7 +5,9 @@ from config import ROCKET_USER, ROCKET_PASS
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, InvalidElementStateException
+from rocket_money.login_state import LoginState, detect_login_state
 from utils.logger import log
+from utils.selector_cache import find_first
 
 
 def handle_login_form(driver, wait):
@@ -16,36 +18,27 @@ def handle_login_form(driver, wait):
         wait: WebDriverWait instance
     """
     log("Waiting for login form...")
+    timeout = getattr(wait, "_timeout", 20)
     try:
         # Try multiple selectors for the login form
         selectors = [
-            # "input[name='username']",
-            # "input[name='email']",
-            "input[type='email']"
-            # "input[placeholder*='email']",
-            # "input[placeholder*='Email']",
-            # "input[placeholder*='username']",
-            # "input[placeholder*='Username']",
-            # "input[id*='username']",
-            # "input[id*='email']",
-            # "input[type='text'][placeholder*='email']",
-            # "input[type='text'][placeholder*='Email']"
+            # (By.CSS_SELECTOR, "input[name='username']"),
+            # (By.CSS_SELECTOR, "input[name='email']"),
+            (By.CSS_SELECTOR, "input[type='email']")
+            # (By.CSS_SELECTOR, "input[placeholder*='email']"),
+            # (By.CSS_SELECTOR, "input[placeholder*='Email']"),
+            # (By.CSS_SELECTOR, "input[placeholder*='username']"),
+            # (By.CSS_SELECTOR, "input[placeholder*='Username']"),
+            # (By.CSS_SELECTOR, "input[id*='username']"),
+            # (By.CSS_SELECTOR, "input[id*='email']"),
+            # (By.CSS_SELECTOR, "input[type='text'][placeholder*='email']"),
+            # (By.CSS_SELECTOR, "input[type='text'][placeholder*='Email']")
         ]
         
-        username_field = None
-        for selector in selectors:
-            try:
-                log(f"Trying selector: {selector}")
-                username_field = wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                if username_field:
-                    log(f"Found username field with selector: {selector}")
-                    break
-            except:
-                continue
-        
-        if not username_field:
+        try:
+            username_field, selector = find_first(driver, "login.username", selectors, timeout=timeout)
+            log(f"Found username field with selector: {selector[1]}")
+        except TimeoutException:
             raise Exception("Could not find username field with any selector")
         
         # Take a screenshot before entering credentials
@@ -63,27 +56,17 @@ def handle_login_form(driver, wait):
         
         # Try to find password field
         password_selectors = [
-            # "input[name='password']",
-            "input[type='password']",
-            # "input[placeholder*='password']",
-            # "input[placeholder*='Password']",
-            # "input[id*='password']"
+            # (By.CSS_SELECTOR, "input[name='password']"),
+            (By.CSS_SELECTOR, "input[type='password']"),
+            # (By.CSS_SELECTOR, "input[placeholder*='password']"),
+            # (By.CSS_SELECTOR, "input[placeholder*='Password']"),
+            # (By.CSS_SELECTOR, "input[id*='password']")
         ]
         
-        password_field = None
-        for selector in password_selectors:
-            try:
-                log(f"Trying password selector: {selector}")
-                password_field = wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                if password_field:
-                    log(f"Found password field with selector: {selector}")
-                    break
-            except:
-                continue
-        
-        if not password_field:
+        try:
+            password_field, selector = find_first(driver, "login.password", password_selectors, timeout=timeout)
+            log(f"Found password field with selector: {selector[1]}")
+        except TimeoutException:
             raise Exception("Could not find password field with any selector")
         
         password_field.clear()
@@ -93,35 +76,32 @@ def handle_login_form(driver, wait):
             password_field.send_keys(char)
         time.sleep(0.5)
         
-        # Try to find login button
+        # Try to find login button. CSS has no :contains(), so text
+        # matches are expressed as XPath.
         button_selectors = [
-            "button[type='submit']",
-            "button:contains('Sign in')",
-            "button:contains('Log in')",
-            "button:contains('Login')",
-            "button:contains('Sign In')",
-            "button:contains('Log In')",
-            "input[type='submit']",
-            "button[class*='login']",
-            "button[class*='signin']",
-            "button[id*='login']",
-            "button[id*='signin']"
+            (By.CSS_SELECTOR, "button[type='submit']"),
+            (By.XPATH, "//button[contains(normalize-space(.), 'Sign in')]"),
+            (By.XPATH, "//button[contains(normalize-space(.), 'Log in')]"),
+            (By.XPATH, "//button[contains(normalize-space(.), 'Login')]"),
+            (By.XPATH, "//button[contains(normalize-space(.), 'Sign In')]"),
+            (By.XPATH, "//button[contains(normalize-space(.), 'Log In')]"),
+            (By.CSS_SELECTOR, "input[type='submit']"),
+            (By.CSS_SELECTOR, "button[class*='login']"),
+            (By.CSS_SELECTOR, "button[class*='signin']"),
+            (By.CSS_SELECTOR, "button[id*='login']"),
+            (By.CSS_SELECTOR, "button[id*='signin']")
         ]
         
-        login_button = None
-        for selector in button_selectors:
-            try:
-                log(f"Trying button selector: {selector}")
-                login_button = wait.until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                )
-                if login_button:
-                    log(f"Found login button with selector: {selector}")
-                    break
-            except:
-                continue
-        
-        if not login_button:
+        try:
+            login_button, selector = find_first(
+                driver,
+                "login.submit",
+                button_selectors,
+                condition=EC.element_to_be_clickable,
+                timeout=timeout
+            )
+            log(f"Found login button with selector: {selector[1]}")
+        except TimeoutException:
             raise Exception("Could not find login button with any selector")
         
         login_button.click()
@@ -144,9 +124,8 @@ def handle_2fa(driver, wait):
     log("Waiting for 2-factor authentication...")
     
     try:
-        # Check if we are already logged in by verifying if we have reached the expected logged-in URL
-        logged_in_url = "https://app.rocketmoney.com/"  # Replace with your actual logged-in page URL
-        if driver.current_url.startswith(logged_in_url):
+        # Check if we are already logged in
+        if detect_login_state(driver) is LoginState.LOGGED_IN:
             log("Already logged in. Skipping 2FA.")
             return  # Exit gracefully
         
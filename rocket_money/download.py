@@ -0,0 +1,128 @@
+"""Direct HTTP download of Rocket Money exports using the browser's session cookies."""
+
+import os
+import re
+import time
+import requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from utils.logger import log
+
+
+class DirectDownloadUnavailable(Exception):
+    """Raised when the export can only be fetched through the browser.
+
+    This happens when the HTTP request is redirected to the login page, or when
+    the link answers with an HTML page instead of the CSV file.
+    """
+
+
+_http_session = None
+
+
+def get_http_session():
+    """Return the module-wide pooled HTTP session.
+
+    Returns:
+        requests.Session: Session with a keep-alive connection pool
+    """
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=2)
+        _http_session.mount("https://", adapter)
+        _http_session.mount("http://", adapter)
+    return _http_session
+
+
+def copy_browser_cookies(driver, http):
+    """Copy the Selenium driver's cookies and user agent into an HTTP session.
+
+    Args:
+        driver: Selenium WebDriver instance with an authenticated session
+        http: requests.Session to receive the cookies
+    """
+    for cookie in driver.get_cookies():
+        http.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+        )
+    http.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+
+
+def _file_name_from_response(response):
+    """Pick a file name from Content-Disposition, then the URL path, then a dated name.
+
+    The dated fallback matches the names Rocket Money gives its exports, so
+    uploads from different days do not collide in Drive.
+    """
+    disposition = response.headers.get("Content-Disposition", "")
+    match = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', disposition)
+    if match:
+        return os.path.basename(match.group(1))
+    path_name = os.path.basename(urlparse(response.url).path)
+    if path_name.endswith(".csv"):
+        return path_name
+    return f"{time.strftime('%Y-%m-%d')}-transactions.csv"
+
+
+def download_with_browser_cookies(driver, download_link, local_file, timeout=60, chunk_size=64 * 1024,
+                                  on_chunk=None):
+    """Download the export over HTTP using the driver's session cookies.
+
+    The response is streamed to a temporary file next to local_file and moved
+    into place once complete; the temporary file is deleted if the download
+    fails, so a partial download is never left behind.
+
+    Args:
+        driver: Selenium WebDriver instance with an authenticated session, or
+            None to use cookies already copied with copy_browser_cookies()
+        download_link: URL from the export email
+        local_file: Path to write the CSV to
+        timeout: Read timeout in seconds (default: 60)
+        chunk_size: Bytes per streamed chunk (default: 64 KiB)
+        on_chunk: Optional callable run on each chunk as it is written, e.g.
+            CSVIngester.feed to hash and parse the export in the same pass
+
+    Returns:
+        str: Original file name of the export (used for the Drive upload)
+
+    Raises:
+        DirectDownloadUnavailable: If the link needs a browser to complete
+        requests.RequestException: On network or HTTP errors
+    """
+    http = get_http_session()
+    if driver is not None:
+        copy_browser_cookies(driver, http)
+
+    log("Downloading export over HTTP with browser session cookies...")
+    start = time.time()
+    with http.get(download_link, stream=True, allow_redirects=True, timeout=(10, timeout)) as response:
+        redirected_urls = [r.headers.get("Location", "") for r in response.history] + [response.url]
+        if any("login" in url.lower() for url in redirected_urls):
+            raise DirectDownloadUnavailable(f"HTTP download was redirected to login: {response.url}")
+        response.raise_for_status()
+
+        content_type = response.headers.get("Content-Type", "")
+        if "text/html" in content_type:
+            raise DirectDownloadUnavailable(f"Download link returned an HTML page: {response.url}")
+
+        file_name = _file_name_from_response(response)
+        temp_file = f"{local_file}.part"
+        size = 0
+        try:
+            with open(temp_file, "wb") as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    size += len(chunk)
+                    if on_chunk:
+                        on_chunk(chunk)
+            os.replace(temp_file, local_file)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    log(f"Downloaded {file_name} ({size} bytes) in {time.time() - start:.2f} seconds")
+    return file_name
@@ -2,23 +2,101 @@
 
 import os
 import undetected_chromedriver as uc
+from utils.logger import log
 
 
-def get_chrome_options():
+# Window size used in lean mode instead of maximizing
+LEAN_WINDOW_SIZE = "1280,800"
+
+# URL patterns blocked in lean mode (images, fonts, media and analytics)
+LEAN_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3", "*.wav",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*segment.io*", "*segment.com*", "*mixpanel.com*", "*amplitude.com*",
+    "*hotjar.com*", "*fullstory.com*", "*sentry.io*", "*intercom.io*",
+    "*facebook.net*", "*connect.facebook.com*",
+]
+
+
+def get_download_dir():
+    """Return the directory Chrome downloads into, creating it if needed.
+
+    Returns:
+        str: Absolute path of the download directory
+    """
+    download_dir = os.path.join(os.getcwd(), 'downloads')
+    if not os.path.exists(download_dir):
+        os.makedirs(download_dir)
+    return download_dir
+
+
+def get_chrome_options(lean=False, capture_network=False):
     """Configure Chrome options with user data persistence.
-    
+
+    Args:
+        lean: Run headless with a fixed small window and images disabled, for
+            server runs (default: False). Pair with configure_driver() to also
+            block fonts, media and analytics requests.
+        capture_network: Enable the DevTools performance log so network
+            responses can be read back with driver.get_log('performance')
+            (default: False)
+
     Returns:
         uc.ChromeOptions: Configured Chrome options
     """
     options = uc.ChromeOptions()
-    options.add_argument('--start-maximized')
-    
+    if lean:
+        options.add_argument('--headless=new')
+        options.add_argument(f'--window-size={LEAN_WINDOW_SIZE}')
+        options.add_argument('--blink-settings=imagesEnabled=false')
+        options.add_argument('--mute-audio')
+        options.add_argument('--disable-extensions')
+    else:
+        options.add_argument('--start-maximized')
+
     # Set up user data directory for session persistence
     user_data_dir = os.path.join(os.getcwd(), 'chrome_user_data')
     if not os.path.exists(user_data_dir):
         os.makedirs(user_data_dir)
     options.add_argument(f'--user-data-dir={user_data_dir}')
     options.add_argument('--profile-directory=Default')
-    
+
+    # Download explicitly into our own directory instead of ~/Downloads
+    prefs = {
+        'download.default_directory': get_download_dir(),
+        'download.prompt_for_download': False,
+        'download.directory_upgrade': True,
+    }
+    if lean:
+        prefs['profile.managed_default_content_settings.images'] = 2
+    options.add_experimental_option('prefs', prefs)
+
+    if capture_network:
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
     return options
 
+
+def configure_driver(driver, lean=False):
+    """Apply DevTools settings to a freshly started driver.
+
+    Allows downloads into get_download_dir() (required in headless mode) and,
+    in lean mode, blocks images, fonts, media and analytics requests.
+
+    Args:
+        driver: Selenium WebDriver instance
+        lean: Enable request blocking (default: False)
+    """
+    try:
+        driver.execute_cdp_cmd('Page.setDownloadBehavior', {
+            'behavior': 'allow',
+            'downloadPath': get_download_dir(),
+        })
+        if lean:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': LEAN_BLOCKED_URLS})
+            log(f"Lean mode: blocking {len(LEAN_BLOCKED_URLS)} resource URL patterns")
+    except Exception as e:
+        log(f"Could not apply DevTools driver settings: {str(e)}", "error")
@@ -0,0 +1,105 @@
+"""Export job queue for running several Rocket Money exports in one session."""
+
+from dataclasses import dataclass
+from typing import Optional
+from config import ROCKET_DATE_RANGE_MAP, ROCKET_DATE_SELECT
+from utils.csv_ingest import csv_rows, csv_path
+from utils.logger import log
+
+
+DEFAULT_CATEGORY = "Piano Income"
+
+
+@dataclass
+class ExportJob:
+    """One (category, date range) export and what it produced.
+
+    Attributes:
+        category: Category name as shown in the Rocket Money filter
+        date_range: Key into ROCKET_DATE_RANGE_MAP
+        requested_at: Time the export was confirmed (time.time())
+        download_link: Link from the matching export email
+        local_file: Path of the downloaded CSV
+    """
+    category: str = DEFAULT_CATEGORY
+    date_range: str = ROCKET_DATE_SELECT
+    requested_at: Optional[float] = None
+    download_link: Optional[str] = None
+    local_file: Optional[str] = None
+
+    @property
+    def date_range_text(self):
+        """Date range label as shown in the Rocket Money filter."""
+        return ROCKET_DATE_RANGE_MAP[self.date_range][1]
+
+    def __str__(self):
+        return f"{self.category} / {self.date_range_text}"
+
+
+def parse_job_spec(spec):
+    """Parse a "Category=DATE_RANGE_KEY" job specification.
+
+    The date range may be omitted ("Category") to use ROCKET_DATE_SELECT.
+
+    Args:
+        spec: Job specification string
+
+    Returns:
+        ExportJob: Parsed job
+
+    Raises:
+        ValueError: If the date range key is not in ROCKET_DATE_RANGE_MAP
+    """
+    category, _, date_range = spec.partition("=")
+    date_range = date_range.strip() or ROCKET_DATE_SELECT
+    if date_range not in ROCKET_DATE_RANGE_MAP:
+        raise ValueError(
+            f"Unknown date range '{date_range}', expected one of: {', '.join(map(str, ROCKET_DATE_RANGE_MAP))}"
+        )
+    return ExportJob(category=category.strip(), date_range=date_range)
+
+
+def _csv_categories(csv_file):
+    """Return the set of values in a CSV's Category column."""
+    with csv_rows(csv_file) as (header, reader):
+        if "Category" not in header:
+            return set()
+        idx = header.index("Category")
+        return {row[idx].strip().lower() for row in reader if len(row) > idx and row[idx].strip()}
+
+
+def assign_files_to_jobs(jobs, files):
+    """Match downloaded export files back to the jobs that requested them.
+
+    The export emails don't say which export they belong to, so files are
+    matched on their Category column first and by request order otherwise.
+
+    Args:
+        jobs: List of ExportJob in the order they were requested
+        files: List of downloaded CSV paths or IngestedCSV handles in email
+            arrival order
+
+    Returns:
+        list: The jobs, with local_file set where a file was matched
+    """
+    unassigned_jobs = list(jobs)
+    unmatched_files = []
+    for csv_file in files:
+        file_path = csv_path(csv_file)
+        categories = _csv_categories(csv_file)
+        candidates = [j for j in unassigned_jobs if categories == {j.category.lower()}]
+        if candidates:
+            job = candidates[0]
+            job.local_file = file_path
+            unassigned_jobs.remove(job)
+        else:
+            unmatched_files.append(file_path)
+
+    for job, file_path in zip(unassigned_jobs, unmatched_files):
+        log(f"Matching {file_path} to job '{job}' by request order")
+        job.local_file = file_path
+
+    for job in jobs:
+        if not job.local_file:
+            log(f"No export file received for job '{job}'", "error")
+    return jobs
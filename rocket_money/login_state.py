@@ -0,0 +1,75 @@
+"""Fast detection of the Rocket Money login state."""
+
+import time
+from enum import Enum
+from utils.logger import log
+
+
+class LoginState(Enum):
+    """Where the browser is in the Rocket Money login flow."""
+    LOGGED_IN = "logged_in"
+    NEEDS_CREDENTIALS = "needs_credentials"
+    NEEDS_2FA = "needs_2fa"
+    UNKNOWN = "unknown"
+
+
+# Checks every logged-in and logged-out signal in a single round trip.
+# Credentials and 2FA signals take precedence over logged-in signals so a
+# login form rendered inside the app shell is still treated as logged out.
+_PROBE_SCRIPT = """
+const visible = (el) => !!el && !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+const css = (sel) => Array.from(document.querySelectorAll(sel)).some(visible);
+const xpath = (expr) => visible(document.evaluate(
+    expr, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue);
+if (document.readyState === 'loading') {
+    return 'unknown';
+}
+const url = window.location.href.toLowerCase();
+if (css("input[type='password']") || css("input[type='email']")) {
+    return 'needs_credentials';
+}
+if (css("input[autocomplete='one-time-code']")
+        || (/(2fa|mfa|verify|verification|code)/.test(url) && css("input[type='text'], input[inputmode='numeric']"))) {
+    return 'needs_2fa';
+}
+const loggedIn = [
+    "//a[contains(text(), 'Transactions')]",
+    "//a[contains(text(), 'Dashboard')]",
+    "//button[contains(text(), 'Export')]",
+    "//div[contains(@class, 'dashboard')]",
+    "//div[contains(@class, 'transactions')]"
+];
+if (loggedIn.some(xpath) || css("a[href*='/transactions']")) {
+    return 'logged_in';
+}
+if (css("input[type='text']") && !url.includes('app.rocketmoney.com')) {
+    return 'needs_2fa';
+}
+return 'unknown';
+"""
+
+
+def detect_login_state(driver, timeout=5, poll_frequency=0.2):
+    """Probe the page until a definite login state appears or timeout expires.
+
+    Args:
+        driver: Selenium WebDriver instance
+        timeout: Maximum seconds to probe (default: 5)
+        poll_frequency: Seconds between probes (default: 0.2)
+
+    Returns:
+        LoginState: Detected state, UNKNOWN if nothing conclusive was found
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    while True:
+        try:
+            state = LoginState(driver.execute_script(_PROBE_SCRIPT))
+        except Exception as e:
+            # The page may be mid-navigation; try again on the next poll
+            log(f"Login state probe failed: {str(e)}")
+            state = LoginState.UNKNOWN
+        if state is not LoginState.UNKNOWN or time.monotonic() >= deadline:
+            log(f"Login state: {state.value} (detected in {time.monotonic() - start:.2f}s)")
+            return state
+        time.sleep(poll_frequency)
@@ -0,0 +1,132 @@
+"""Managed Chrome session shared across the export and download stages."""
+
+import time
+import undetected_chromedriver as uc
+from selenium.webdriver.support.ui import WebDriverWait
+from rocket_money.driver import get_chrome_options, configure_driver
+from utils.logger import log
+
+
+class BrowserSession:
+    """Lazily started Chrome session that several stages can borrow.
+
+    The driver is only launched the first time it is requested, and stays
+    alive until quit() is called, so the download can run in the browser that
+    already logged in during the export. Stages that receive a session must
+    not quit the driver themselves.
+
+    Usage:
+        with BrowserSession() as session:
+            export_rocket_money_data(session=session)
+            download_and_save_to_drive(link, session=session)
+    """
+
+    def __init__(self, timeout=20, lean=False, capture_network=False):
+        """Configure the session.
+
+        Args:
+            timeout: Default WebDriverWait timeout in seconds (default: 20)
+            lean: Start a headless browser with resource blocking (default: False)
+            capture_network: Record network events in the performance log
+                (default: False)
+        """
+        self.timeout = timeout
+        self.lean = lean
+        self.capture_network = capture_network
+        self._driver = None
+        self._wait = None
+        self._closing = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.quit()
+        return False
+
+    @property
+    def running(self):
+        """True if a driver has been started and not quit yet."""
+        return self._driver is not None
+
+    @property
+    def driver(self):
+        """The shared WebDriver, started on first access."""
+        if self._driver is None:
+            self.start()
+        return self._driver
+
+    @property
+    def wait(self):
+        """WebDriverWait bound to the shared driver."""
+        if self._driver is None:
+            self.start()
+        return self._wait
+
+    def start(self):
+        """Launch Chrome with the persistent profile."""
+        self._wait_for_close()
+        log(f"Initializing Chrome driver{' (lean mode)' if self.lean else ''}...")
+        options = get_chrome_options(lean=self.lean, capture_network=self.capture_network)
+        self._driver = uc.Chrome(options=options)
+        configure_driver(self._driver, lean=self.lean)
+        self._wait = WebDriverWait(self._driver, self.timeout)
+
+    def is_alive(self):
+        """Check whether the driver is running and still responding.
+
+        Returns:
+            bool: True if the browser session is usable
+        """
+        if self._driver is None:
+            return False
+        try:
+            self._driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def quit(self):
+        """Quit the driver if it was started. The next access starts a new one."""
+        self._wait_for_close()
+        if self._driver is None:
+            return
+        driver = self._driver
+        self._driver = None
+        self._wait = None
+        _quit_driver(driver)
+
+    def quit_async(self, executor):
+        """Quit the driver on an executor thread so other work can overlap it.
+
+        The session can still be used afterwards: the next access to driver
+        waits for the shutdown to finish (releasing the profile directory)
+        and starts a new browser.
+
+        Args:
+            executor: concurrent.futures.Executor to run the shutdown on
+        """
+        self._wait_for_close()
+        if self._driver is None:
+            return
+        driver = self._driver
+        self._driver = None
+        self._wait = None
+        self._closing = executor.submit(_quit_driver, driver)
+
+    def _wait_for_close(self):
+        """Block until a background quit_async() shutdown has finished."""
+        if self._closing is not None:
+            self._closing.result()
+            self._closing = None
+
+
+def _quit_driver(driver):
+    """Quit a WebDriver, ignoring errors from an already dead browser."""
+    log("Quitting driver...")
+    start = time.monotonic()
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    log(f"Driver quit in {time.monotonic() - start:.2f} seconds")
@@ -0,0 +1,185 @@
+"""EmailWatcher tests against a scripted local IMAP server.
+
+The server speaks just enough IMAP for the watcher: LOGIN, SELECT, STATUS,
+UID SEARCH, NOOP, IDLE/DONE and LOGOUT. Each test picks how IDLE behaves:
+stay silent, push an EXISTS later from another thread, or send the EXISTS in
+the same write as the IDLE continuation, so it is already in imaplib's buffer
+when the watcher starts waiting.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import re
+import sys
+import time
+import tempfile
+import threading
+import socketserver
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_processor.checkpoint import MailboxCheckpoint  # noqa: E402
+from email_processor.watcher import EmailWatcher  # noqa: E402
+
+UIDVALIDITY = 7
+
+
+class ScriptedIMAPServer(socketserver.ThreadingTCPServer):
+    """IMAP stand-in with one mailbox whose messages all match the search."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, uidnext, idle_mode="silent"):
+        super().__init__(("127.0.0.1", 0), ScriptedIMAPHandler)
+        self.uids = list(range(1, uidnext))
+        self.idle_mode = idle_mode
+        self.idlers = []
+        self.commands = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def uidnext(self):
+        return self.uids[-1] + 1 if self.uids else 1
+
+    def deliver(self):
+        """Add a message and push EXISTS to every client sitting in IDLE."""
+        with self.lock:
+            self.uids.append(self.uidnext)
+            idlers, self.idlers = self.idlers, []
+        for handler in idlers:
+            handler.send(f"* {len(self.uids)} EXISTS\r\n")
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ScriptedIMAPHandler(socketserver.StreamRequestHandler):
+    def send(self, text):
+        self.wfile.write(text.encode())
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        self.send("* OK scripted IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, command, *rest = line.decode().strip().split(" ", 2)
+            command = command.upper()
+            args = rest[0] if rest else ""
+            server.commands.append(command)
+            if command == "CAPABILITY":
+                self.send(f"* CAPABILITY IMAP4rev1 IDLE\r\n{tag} OK done\r\n")
+            elif command in ("LOGIN", "NOOP"):
+                self.send(f"{tag} OK done\r\n")
+            elif command == "SELECT":
+                self.send(f"* {len(server.uids)} EXISTS\r\n* OK [UIDVALIDITY {UIDVALIDITY}] ok\r\n"
+                          f"{tag} OK [READ-WRITE] done\r\n")
+            elif command == "STATUS":
+                self.send(f"* STATUS INBOX (UIDNEXT {server.uidnext} UIDVALIDITY {UIDVALIDITY})\r\n"
+                          f"{tag} OK done\r\n")
+            elif command == "UID" and args.upper().startswith("SEARCH"):
+                match = re.search(r"UID (\d+):\*", args)
+                low = int(match.group(1)) if match else 1
+                uids = [uid for uid in server.uids if uid >= low]
+                if match and not uids and server.uids:
+                    # "n:*" always matches the highest UID
+                    uids = [server.uids[-1]]
+                self.send(f"* SEARCH {' '.join(map(str, uids))}\r\n{tag} OK done\r\n".replace("SEARCH \r", "SEARCH\r"))
+            elif command == "IDLE":
+                if server.idle_mode == "buffered":
+                    with server.lock:
+                        server.uids.append(server.uidnext)
+                    self.send(f"+ idling\r\n* {len(server.uids)} EXISTS\r\n")
+                else:
+                    self.send("+ idling\r\n")
+                    with server.lock:
+                        server.idlers.append(self)
+                done = self.rfile.readline()
+                server.commands.append(done.decode().strip())
+                with server.lock:
+                    if self in server.idlers:
+                        server.idlers.remove(self)
+                self.send(f"{tag} OK IDLE terminated\r\n")
+            elif command == "LOGOUT":
+                self.send(f"* BYE\r\n{tag} OK done\r\n")
+                return
+            else:
+                self.send(f"{tag} BAD unknown command\r\n")
+
+
+class EmailWatcherTest(unittest.TestCase):
+    def start_watcher(self, uidnext=8, idle_mode="silent"):
+        self.server = ScriptedIMAPServer(uidnext, idle_mode)
+        self.addCleanup(self.server.close)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.checkpoint = MailboxCheckpoint(os.path.join(temp_dir.name, "email_checkpoint.json"))
+        watcher = EmailWatcher(host="127.0.0.1", port=self.server.port, user="user", password="secret",
+                               use_ssl=False, checkpoint=self.checkpoint)
+        watcher.start()
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def test_baseline_is_uidnext_minus_one(self):
+        watcher = self.start_watcher(uidnext=8)
+        self.assertEqual(watcher.baseline_uid, 7)
+        self.assertEqual(watcher.uidvalidity, UIDVALIDITY)
+        self.assertTrue(watcher.supports_idle)
+        # The search matches UID 7 through "8:*", which is below the baseline
+        self.assertIsNone(watcher._find_new_message())
+
+    def test_exists_pushed_during_idle(self):
+        watcher = self.start_watcher(uidnext=8)
+        threading.Timer(0.3, self.server.deliver).start()
+        start = time.monotonic()
+        watcher._idle(10)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIn("DONE", self.server.commands)
+        self.assertEqual(watcher._find_new_message(), 8)
+
+    def test_exists_buffered_with_idle_continuation(self):
+        watcher = self.start_watcher(uidnext=8, idle_mode="buffered")
+        start = time.monotonic()
+        watcher._idle(10)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertIn("DONE", self.server.commands)
+        self.assertEqual(watcher._find_new_message(), 8)
+
+    def test_idle_timeout(self):
+        watcher = self.start_watcher(uidnext=8)
+        start = time.monotonic()
+        watcher._idle(0.5)
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertLess(elapsed, 5)
+        self.assertIn("DONE", self.server.commands)
+        self.assertIsNone(watcher._find_new_message())
+
+    def test_wait_for_link_returns_new_message(self):
+        watcher = self.start_watcher(uidnext=8)
+        watcher._fetch_link = lambda uid: f"https://example.com/export/{uid}"
+        threading.Timer(0.3, self.server.deliver).start()
+        self.assertEqual(watcher.wait_for_link(timeout=10), "https://example.com/export/8")
+        self.assertEqual(watcher.baseline_uid, 8)
+        self.assertEqual(self.checkpoint.last_uid_for(UIDVALIDITY), 8)
+
+    def test_wait_for_link_times_out(self):
+        watcher = self.start_watcher(uidnext=8)
+        watcher._fetch_link = lambda uid: f"https://example.com/export/{uid}"
+        self.assertIsNone(watcher.wait_for_link(timeout=0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""Recorded-response tests for the network-capture export engine.
+
+The fixtures in tests/fixtures/network_export/ are hand-written response
+records in the format NetworkCapture saves with record_dir, built around the
+placeholder operation names and field paths in rocket_money/network_export.py
+rather than recorded from the app: one transactions page, an
+unrelated GraphQL operation that also returns amounts and dates, and a
+second transactions page repeating one transaction.
+
+Usage:
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rocket_money.network_export import (  # noqa: E402
+    CSV_FIELDNAMES, graphql_operations, load_recorded_responses, transactions_from_responses,
+    validate_rows, write_transactions_csv,
+)
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "network_export")
+
+
+class RecordedResponsesTest(unittest.TestCase):
+    def setUp(self):
+        self.bodies = load_recorded_responses(FIXTURE_DIR)
+
+    def test_only_transaction_operations_are_loaded(self):
+        self.assertEqual(len(self.bodies), 2)
+
+    def test_rows_match_the_emailed_export(self):
+        rows = transactions_from_responses(self.bodies)
+        validate_rows(rows, CSV_FIELDNAMES)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            local_file = os.path.join(temp_dir, "export.csv")
+            ingested = write_transactions_csv(rows, local_file)
+            with open(local_file, "r", encoding="utf-8") as f:
+                written = f.read()
+        with open(os.path.join(FIXTURE_DIR, "expected.csv"), "r", encoding="utf-8") as f:
+            self.assertEqual(written, f.read())
+        self.assertEqual(ingested.header, CSV_FIELDNAMES)
+        self.assertEqual(len(ingested.rows), len(rows))
+
+    def test_category_filter(self):
+        rows = transactions_from_responses(self.bodies, category="piano income")
+        self.assertEqual([row["Amount"] for row in rows], ["-350.00", "-120.10"])
+
+    def test_header_mismatch_is_rejected(self):
+        rows = transactions_from_responses(self.bodies)
+        with self.assertRaises(ValueError):
+            validate_rows(rows, CSV_FIELDNAMES[:-1])
+
+    def test_malformed_amount_is_rejected(self):
+        rows = transactions_from_responses(self.bodies)
+        rows[0]["Amount"] = "12.5"
+        with self.assertRaises(ValueError):
+            validate_rows(rows)
+
+
+class GraphQLOperationsTest(unittest.TestCase):
+    def test_operation_from_post_body(self):
+        body = '{"operationName": "TransactionsQuery", "variables": {}}'
+        self.assertEqual(graphql_operations("https://example.com/graphql", body), ["TransactionsQuery"])
+
+    def test_operations_from_batched_body(self):
+        body = '[{"operationName": "AccountsQuery"}, {"operationName": "TransactionsQuery"}]'
+        self.assertEqual(graphql_operations("https://example.com/graphql", body),
+                         ["AccountsQuery", "TransactionsQuery"])
+
+    def test_operation_from_get_url(self):
+        url = "https://example.com/graphql?operationName=TransactionsQuery&variables=%7B%7D"
+        self.assertEqual(graphql_operations(url), ["TransactionsQuery"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,212 @@
+"""Single-pass ingest of a downloaded CSV export.
+
+The export is seen once, in large blocks, either as it streams from the
+network or while it is copied from the download directory. Each block is
+added to the MD5 digest and parsed as CSV, so later stages get the
+checksum, header and rows without opening the file again. Rows are only
+kept for exports up to MAX_PARSED_BYTES; larger ones keep just the header
+and a sample, and the Sheets append reads them with the columnar engine.
+"""
+
+import os
+import csv
+import codecs
+import hashlib
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from utils.logger import log
+
+
+# Local path of an ingested export with its size in bytes, hex MD5 (the
+# digest Drive reports as md5Checksum), header row, first data rows and all
+# parsed data rows (None if the export was too large to keep in memory)
+IngestedCSV = namedtuple("IngestedCSV", ["path", "size", "md5", "header", "samples", "rows"])
+
+# Bytes read and written per block
+BLOCK_SIZE = 1024 * 1024
+
+# Largest export whose rows are kept in memory
+MAX_PARSED_BYTES = 32 * 1024 * 1024
+
+# Data rows kept for logging when the rows themselves are not
+SAMPLE_ROWS = 2
+
+
+class CSVIngester:
+    """Hash and parse a CSV from the blocks fed to it.
+
+    Blocks are cut at the last line break outside a quoted field, so a
+    quoted value spanning two blocks is parsed whole.
+
+    Usage:
+        ingester = CSVIngester(local_file)
+        for block in blocks:
+            ingester.feed(block)
+        ingested = ingester.finish()
+    """
+
+    def __init__(self, path, max_parsed_bytes=MAX_PARSED_BYTES):
+        """Start an empty ingest.
+
+        Args:
+            path: Local path the blocks are (or will be) stored at
+            max_parsed_bytes: Keep parsed rows only up to this size
+                (default: MAX_PARSED_BYTES)
+        """
+        self.path = path
+        self.max_parsed_bytes = max_parsed_bytes
+        self.digest = hashlib.md5()
+        self.size = 0
+        self.header = None
+        self.samples = []
+        self.rows = []
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._pending = ""
+
+    def feed(self, block):
+        """Add a block of the file.
+
+        Args:
+            block: Next bytes of the file
+
+        Raises:
+            ValueError: If the data is not UTF-8
+        """
+        self.digest.update(block)
+        self.size += len(block)
+        if self.rows is None and self.samples_done:
+            return
+        if self.rows is not None and self.size > self.max_parsed_bytes:
+            log(f"{self.path} is over {self.max_parsed_bytes} bytes, keeping only its header and a sample")
+            self.rows = None
+        lines = (self._pending + self._decoder.decode(block)).split("\n")
+        self._pending = lines.pop()
+        cut = 0
+        in_quotes = False
+        for number, line in enumerate(lines):
+            if line.count('"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes:
+                cut = number + 1
+        if cut < len(lines):
+            self._pending = "\n".join(lines[cut:] + [self._pending])
+        self._parse(lines[:cut])
+
+    @property
+    def samples_done(self):
+        """Whether the header and sample rows have been parsed."""
+        return self.header is not None and len(self.samples) >= SAMPLE_ROWS
+
+    def _parse(self, lines):
+        """Parse complete records and keep the header, samples and rows."""
+        reader = csv.reader(line + "\n" for line in lines)
+        if self.header is None:
+            self.header = next(reader, None)
+        for row in reader:
+            if len(self.samples) < SAMPLE_ROWS:
+                self.samples.append(row)
+            if self.rows is not None:
+                self.rows.append(row)
+            elif self.samples_done:
+                return
+
+    def finish(self):
+        """Parse the last line and validate the file.
+
+        Returns:
+            IngestedCSV: Handle to pass to later stages
+
+        Raises:
+            ValueError: If the file is empty, has no header row or is not UTF-8
+        """
+        if not (self.rows is None and self.samples_done):
+            self._pending += self._decoder.decode(b"", final=True)
+            if self._pending:
+                self._parse(self._pending.split("\n"))
+                self._pending = ""
+        if self.size == 0:
+            raise ValueError("Downloaded CSV file is empty")
+        if not self.header or not any(cell.strip() for cell in self.header):
+            raise ValueError("CSV file has no header row")
+        ingested = IngestedCSV(self.path, self.size, self.digest.hexdigest(), self.header,
+                               self.samples, self.rows)
+        rows = f"{len(self.rows)} rows" if self.rows is not None else "rows not kept"
+        log(f"Ingested {self.path}: {self.size} bytes, {rows}, MD5 {ingested.md5}")
+        return ingested
+
+
+def ingest_csv(source, local_file=None, block_size=BLOCK_SIZE):
+    """Copy, hash, parse and validate a CSV in one streaming pass.
+
+    Args:
+        source: Path of the downloaded CSV
+        local_file: Path to copy it to, written via a temporary file and
+            moved into place once complete (default: source, no copy)
+        block_size: Bytes per read (default: 1 MB)
+
+    Returns:
+        IngestedCSV: Handle to pass to later stages
+
+    Raises:
+        FileNotFoundError: If source doesn't exist
+        ValueError: If the file is empty, has no header row or is not UTF-8
+    """
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Downloaded CSV file not found: {source}")
+    local_file = local_file or source
+    copying = os.path.abspath(local_file) != os.path.abspath(source)
+    temp_file = f"{local_file}.part"
+    ingester = CSVIngester(local_file)
+
+    try:
+        with open(source, "rb") as src, open(temp_file, "wb") if copying else nullcontext() as dst:
+            for block in iter(lambda: src.read(block_size), b""):
+                if dst:
+                    dst.write(block)
+                ingester.feed(block)
+        ingested = ingester.finish()
+        if copying:
+            os.replace(temp_file, local_file)
+            log(f"Copied file from download directory to working directory: {local_file}")
+    finally:
+        if copying and os.path.exists(temp_file):
+            os.remove(temp_file)
+    return ingested
+
+
+def is_parsed(csv_file):
+    """Whether csv_file is an IngestedCSV that kept its rows in memory."""
+    return isinstance(csv_file, IngestedCSV) and csv_file.rows is not None
+
+
+@contextmanager
+def csv_rows(csv_file):
+    """Open a CSV path or an IngestedCSV as a header and an iterator of rows.
+
+    Args:
+        csv_file: CSV path, or an IngestedCSV (read from disk if it did not
+            keep its rows)
+
+    Yields:
+        tuple: (header row, iterator over the data rows)
+    """
+    if is_parsed(csv_file):
+        yield csv_file.header, iter(csv_file.rows)
+        return
+    with open(csv_path(csv_file), "r", newline='') as f:
+        reader = csv.reader(f)
+        yield next(reader), reader
+
+
+def csv_path(csv_file):
+    """Path of a CSV given as a path or an IngestedCSV."""
+    return csv_file.path if isinstance(csv_file, IngestedCSV) else csv_file
+
+
+def file_md5(path, block_size=BLOCK_SIZE):
+    """Hex MD5 of a file, read in blocks."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,153 @@
+"""Track browser downloads into a directory without fixed sleeps."""
+
+import os
+import glob
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import fnmatch
+from collections import namedtuple
+from utils.logger import log
+
+
+DownloadResult = namedtuple("DownloadResult", ["path", "size", "elapsed"])
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0x00000800
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """Return libc if it provides inotify (Linux), None otherwise."""
+    if not hasattr(os, "uname") or os.uname().sysname != "Linux":
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class DownloadTracker:
+    """Wait for a browser download to complete in a directory.
+
+    Chrome writes downloads to "<name>.crdownload" and renames the file to its
+    final name once the transfer finishes, so a new file matching the pattern
+    with no ".crdownload" partner is complete. On Linux the rename is picked
+    up from inotify events; elsewhere the directory is polled at a short
+    interval.
+
+    Usage:
+        tracker = DownloadTracker(downloads_dir)
+        tracker.start()
+        driver.get(download_link)
+        result = tracker.wait(timeout=60)
+    """
+
+    def __init__(self, directory, pattern="*-transactions.csv", poll_interval=0.1):
+        """Configure the tracker.
+
+        Args:
+            directory: Directory the browser downloads into
+            pattern: Glob pattern of the expected file name
+            poll_interval: Seconds between scans when inotify is unavailable
+        """
+        self.directory = directory
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.before_files = set()
+        self.start_time = None
+        self._libc = _load_inotify()
+        self._fd = None
+
+    def start(self):
+        """Snapshot existing files and begin watching. Call before the download starts."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.before_files = set(glob.glob(os.path.join(self.directory, self.pattern)))
+        log(f"Found {len(self.before_files)} existing transaction files")
+        self.start_time = time.time()
+
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK)
+            if fd >= 0 and self._libc.inotify_add_watch(
+                    fd, os.fsencode(self.directory), IN_MOVED_TO | IN_CLOSE_WRITE) >= 0:
+                self._fd = fd
+            else:
+                if fd >= 0:
+                    os.close(fd)
+                log(f"inotify unavailable (errno {ctypes.get_errno()}), polling downloads instead")
+
+    def close(self):
+        """Stop watching the directory."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def wait(self, timeout=60):
+        """Block until a new, fully written file matching the pattern appears.
+
+        Args:
+            timeout: Maximum seconds to wait (default: 60)
+
+        Returns:
+            DownloadResult: Path, size in bytes and transfer time in seconds
+
+        Raises:
+            TimeoutError: If no completed download appears in time
+        """
+        deadline = self.start_time + timeout
+        try:
+            while True:
+                new_file = self._completed_file()
+                if new_file:
+                    result = DownloadResult(new_file, os.path.getsize(new_file), time.time() - self.start_time)
+                    log(f"Download complete: {new_file} ({result.size} bytes in {result.elapsed:.2f} seconds)")
+                    return result
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"Timeout waiting for file to download after {timeout} seconds")
+
+                if self._fd is not None:
+                    readable, _, _ = select.select([self._fd], [], [], remaining)
+                    if readable:
+                        self._drain_events()
+                else:
+                    time.sleep(min(self.poll_interval, remaining))
+        finally:
+            self.close()
+
+    def _drain_events(self):
+        """Read and discard pending inotify events; the directory is rescanned after."""
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return
+            raise
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, cookie, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode(errors="replace")
+            offset += name_len
+            if fnmatch.fnmatch(name, self.pattern):
+                log(f"Download event for {name}")
+
+    def _completed_file(self):
+        """Return the newest new file whose ".crdownload" partner is gone, if any."""
+        current_files = set(glob.glob(os.path.join(self.directory, self.pattern)))
+        new_files = [
+            f for f in current_files - self.before_files
+            if not os.path.exists(f + ".crdownload")
+        ]
+        if not new_files:
+            return None
+        return max(new_files, key=os.path.getctime)
@@ -1,6 +1,7 @@
 """Logging utilities for Rocket Money automation."""
 
 import logging
+from collections import Counter
 
 # Configure logging
 logging.basicConfig(
@@ -9,17 +10,106 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+_debug = False
+
+
+def set_debug(enabled=True):
+    """Turn DEBUG output (full per-row logging) on or off.
+
+    Args:
+        enabled: Log "debug" messages to file and console (default: True)
+    """
+    global _debug
+    _debug = enabled
+    logging.getLogger().setLevel(logging.DEBUG if enabled else logging.INFO)
+
+
+def is_debug():
+    """Check whether DEBUG output is enabled.
+
+    Returns:
+        bool: True if "debug" messages are logged
+    """
+    return _debug
+
 
 def log(message, level="info"):
     """Log a message to both file and console.
-    
+
     Args:
         message: The message to log
-        level: Log level - "info" or "error"
+        level: Log level - "info", "error" or "debug" ("debug" messages are
+            dropped unless set_debug() enabled them)
     """
-    if level == "info":
+    if level == "debug":
+        if not _debug:
+            return
+        logging.debug(message)
+    elif level == "info":
         logging.info(message)
     elif level == "error":
         logging.error(message)
     print(message)
 
+
+class LoopLog:
+    """Counters and a small sample of messages for a per-row loop.
+
+    Instead of one log line per row, each event is counted, only the first
+    few messages per event are logged, and summary() writes one line for the
+    whole stage. With DEBUG enabled every message is logged.
+
+    Usage:
+        loop_log = LoopLog("Sheets dedupe")
+        for row in rows:
+            loop_log.record("duplicate", f"Skipping duplicate: {row}")
+        loop_log.summary()
+    """
+
+    def __init__(self, stage, samples=3):
+        """Create a loop log.
+
+        Args:
+            stage: Name of the stage, used as a prefix in log output
+            samples: Messages logged per event before switching to DEBUG only
+                (default: 3)
+        """
+        self.stage = stage
+        self.samples = samples
+        self.counts = Counter()
+
+    def record(self, event, message=None, level="info"):
+        """Count an event and log its message if it is within the sample.
+
+        Args:
+            event: Short event name, e.g. "new" or "duplicate"
+            message: Optional message for this occurrence
+            level: Level for sampled messages - "info" or "error" (default: "info")
+        """
+        self.counts[event] += 1
+        if message is None:
+            return
+        if self.counts[event] <= self.samples:
+            log(f"[{self.stage}] {message}", level)
+        elif _debug:
+            log(f"[{self.stage}] {message}", "debug")
+
+    def add(self, event, count, message=None, level="info"):
+        """Count many occurrences of an event at once, e.g. from a column mask.
+
+        Args:
+            event: Short event name
+            count: Number of occurrences
+            message: Optional message logged once if count is non-zero
+            level: Level for the message - "info" or "error" (default: "info")
+        """
+        if not count:
+            return
+        self.counts[event] += count
+        if message is not None:
+            log(f"[{self.stage}] {message}", level)
+
+    def summary(self):
+        """Log one line with the count of every recorded event."""
+        counts = ", ".join(f"{count} {event}" for event, count in self.counts.items())
+        log(f"[{self.stage}] {counts or 'no rows'}")
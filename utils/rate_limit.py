@@ -0,0 +1,74 @@
+"""Rate limiting and retry backoff helpers for quota-limited APIs."""
+
+import time
+import random
+import threading
+
+
+class TokenBucket:
+    """Token bucket limiting how many requests start per time window.
+
+    Usage:
+        bucket = TokenBucket(rate=60, per=60)
+        bucket.acquire()  # blocks until a request may be sent
+    """
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        """Create a full bucket.
+
+        Args:
+            rate: Requests allowed per period
+            per: Period length in seconds (default: 60)
+            capacity: Maximum burst size (default: rate)
+        """
+        self.fill_rate = rate / per
+        self.capacity = capacity or rate
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """Add the tokens earned since the last update."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """Take tokens, sleeping until enough are available.
+
+        Args:
+            tokens: Number of tokens to take (default: 1)
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.fill_rate
+            time.sleep(delay)
+            waited += delay
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reported the quota exhausted."""
+        with self._lock:
+            self._refill()
+            self.tokens = 0.0
+
+
+def backoff_delay(attempt, base=1.0, maximum=64.0):
+    """Exponential backoff with full jitter.
+
+    Args:
+        attempt: 0-based retry number
+        base: Delay scale for the first retry in seconds (default: 1)
+        maximum: Upper bound on the delay in seconds (default: 64)
+
+    Returns:
+        float: Seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
@@ -0,0 +1,215 @@
+"""Self-learning selector cache for locating page elements.
+
+Each logical element (e.g. "login.submit") has a list of candidate locators,
+the first of which is the primary one. The primary locator is always tried
+first: fallbacks (often positional XPaths that can match the wrong element)
+are only accepted once the primary has had a short grace period to appear,
+unless a fallback won recently, in which case the primary is known to be
+broken. The cache keeps hit/miss counts per locator so stale locators can be
+spotted. It is saved once at the end of a run (save_selector_cache()).
+"""
+
+import os
+import json
+import time
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    TimeoutException,
+    NoSuchElementException,
+    StaleElementReferenceException,
+    InvalidSelectorException,
+)
+from utils.logger import log
+
+
+DEFAULT_CACHE_FILE = "selector_cache.json"
+
+# Seconds a fallback win lets later lookups skip the primary's grace period
+FALLBACK_WIN_TTL = 24 * 60 * 60
+
+
+def _locator_key(locator):
+    """Serialize a (By, value) locator to a string key."""
+    by, value = locator
+    return f"{by}={value}"
+
+
+class SelectorCache:
+    """Persisted record of which locator last worked for each logical element."""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE):
+        """Load the cache from disk.
+
+        Args:
+            path: JSON file the cache is persisted to
+        """
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                log(f"Could not read selector cache {path}, starting fresh: {str(e)}", "error")
+
+    def order(self, name, candidates):
+        """Return candidates with the primary first, then the last known winner.
+
+        Args:
+            name: Logical element name
+            candidates: List of (By, value) locators, primary first
+
+        Returns:
+            list: Reordered candidates
+        """
+        winner = self.entries.get(name, {}).get("winner")
+        primary, fallbacks = candidates[0], candidates[1:]
+        return [primary] + sorted(fallbacks, key=lambda locator: _locator_key(locator) != winner)
+
+    def fallback_won_recently(self, name):
+        """Check whether a fallback resolved the element within FALLBACK_WIN_TTL.
+
+        Args:
+            name: Logical element name
+
+        Returns:
+            bool: True if the primary locator is known to be failing
+        """
+        won_at = self.entries.get(name, {}).get("fallback_won_at")
+        return won_at is not None and time.time() - won_at < FALLBACK_WIN_TTL
+
+    def record(self, name, candidates, winner=None):
+        """Record the outcome of a resolution in memory.
+
+        The winner gets a hit and every other candidate a miss. If nothing
+        matched, all candidates get a miss. A win by any candidate but the
+        first (primary) one is timestamped; a primary win clears it.
+
+        Args:
+            name: Logical element name
+            candidates: List of (By, value) locators that were tried
+            winner: Locator that matched, or None
+        """
+        entry = self.entries.setdefault(name, {"winner": None, "stats": {}})
+        winner_key = _locator_key(winner) if winner else None
+        for locator in candidates:
+            key = _locator_key(locator)
+            stats = entry["stats"].setdefault(key, {"hits": 0, "misses": 0})
+            if key == winner_key:
+                stats["hits"] += 1
+            else:
+                stats["misses"] += 1
+        if winner_key:
+            entry["winner"] = winner_key
+            if winner == candidates[0]:
+                entry.pop("fallback_won_at", None)
+            else:
+                entry["fallback_won_at"] = time.time()
+        self.dirty = True
+
+    def save(self):
+        """Write the cache to disk if anything was recorded since the last save."""
+        if not self.dirty:
+            return
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f, indent=2, sort_keys=True)
+            self.dirty = False
+        except OSError as e:
+            log(f"Could not save selector cache {self.path}: {str(e)}", "error")
+
+    def stats(self):
+        """Return hit/miss counts per element and locator.
+
+        Returns:
+            dict: {name: {locator: {"hits": int, "misses": int}}}
+        """
+        return {name: entry["stats"] for name, entry in self.entries.items()}
+
+    def log_stats(self):
+        """Log hit/miss counts, flagging locators that have never matched."""
+        log("Selector cache stats:")
+        for name, locators in sorted(self.stats().items()):
+            for key, stats in locators.items():
+                stale = " (stale)" if stats["hits"] == 0 else ""
+                log(f"  {name}: {key} hits={stats['hits']} misses={stats['misses']}{stale}")
+
+
+_cache = None
+
+
+def get_selector_cache():
+    """Return the process-wide selector cache, loading it on first use.
+
+    Returns:
+        SelectorCache: Shared cache instance
+    """
+    global _cache
+    if _cache is None:
+        _cache = SelectorCache()
+    return _cache
+
+
+def save_selector_cache():
+    """Save the process-wide selector cache, if it was used. Call once per run."""
+    if _cache is not None:
+        _cache.save()
+
+
+def find_first(driver, name, candidates, condition=EC.presence_of_element_located,
+               timeout=20, poll_frequency=0.1, cache=None, primary_grace=1.0):
+    """Race candidate locators and return the first element matching condition.
+
+    The primary locator is polled from the start; fallbacks join once it has
+    not matched for primary_grace seconds, or straight away if a fallback
+    won recently.
+
+    Args:
+        driver: Selenium WebDriver instance
+        name: Logical element name used as the cache key
+        candidates: List of (By, value) locators, primary first
+        condition: Expected condition factory taking a locator
+            (default: presence_of_element_located)
+        timeout: Overall seconds to wait for any candidate (default: 20)
+        poll_frequency: Seconds between polling rounds (default: 0.1)
+        cache: SelectorCache to use (default: the shared cache)
+        primary_grace: Seconds the primary locator gets on its own before
+            fallbacks are tried (default: 1)
+
+    Returns:
+        tuple: (WebElement, locator) for the first matching candidate
+
+    Raises:
+        TimeoutException: If no candidate matches within timeout
+    """
+    cache = cache or get_selector_cache()
+    ordered = cache.order(name, candidates)
+    invalid = set()
+    start = time.monotonic()
+    deadline = start + timeout
+    fallbacks_from = start if cache.fallback_won_recently(name) else start + min(primary_grace, timeout)
+
+    while True:
+        use_fallbacks = ordered[0] in invalid or time.monotonic() >= fallbacks_from
+        for locator in ordered if use_fallbacks else ordered[:1]:
+            if locator in invalid:
+                continue
+            try:
+                element = condition(locator)(driver)
+            except (NoSuchElementException, StaleElementReferenceException):
+                continue
+            except InvalidSelectorException:
+                log(f"Invalid selector for {name}: {_locator_key(locator)}", "error")
+                invalid.add(locator)
+                continue
+            if element:
+                if locator != ordered[0]:
+                    log(f"Selector for {name} resolved by fallback locator: {_locator_key(locator)}")
+                cache.record(name, ordered, winner=locator)
+                return element, locator
+
+        if time.monotonic() >= deadline:
+            cache.record(name, ordered)
+            raise TimeoutException(f"No locator matched {name} within {timeout}s")
+        time.sleep(poll_frequency)
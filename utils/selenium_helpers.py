@@ -2,21 +2,48 @@
 
 import time
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException
 from utils.logger import log
+from utils.selector_cache import find_first
 
 
-def wait_and_click(driver, wait, text_pattern, fallback_xpath, error_msg, retries=3):
+def xpath_literal(text):
+    """Quote text as an XPath 1.0 string literal.
+    
+    XPath 1.0 has no escape sequences, so text containing both quote kinds
+    is built with concat() from pieces that each avoid one of them.
+    
+    Args:
+        text: Text to match, e.g. a category name from --job
+        
+    Returns:
+        str: XPath expression evaluating to text
+    """
+    if "'" not in text:
+        return f"'{text}'"
+    if '"' not in text:
+        return f'"{text}"'
+    parts = text.split("'")
+    return "concat(" + ", \"'\", ".join(f"'{part}'" for part in parts) + ")"
+
+
+def wait_and_click(driver, text_pattern, fallback_xpath, error_msg, retries=3, name=None, timeout=20):
     """Helper function to wait for and click elements with retry logic and fallback xpath.
     
+    Both XPaths are polled through the selector cache, which always tries the
+    primary pattern first and only falls back when it does not show up.
+    
     Args:
         driver: Selenium WebDriver instance
-        wait: WebDriverWait instance
         text_pattern: Primary XPath pattern to find element
-        fallback_xpath: Fallback XPath if primary pattern fails
+        fallback_xpath: Fallback XPath if primary pattern fails, or None
         error_msg: Error message to log if all attempts fail
         retries: Number of retry attempts (default: 3)
+        name: Logical element name for the selector cache; pass a fixed name
+            when the XPath contains job values (default: text_pattern)
+        timeout: Seconds to wait for the element on each attempt (default: 20)
         
     Returns:
         bool: True if click was successful, False otherwise
@@ -25,19 +52,20 @@ def wait_and_click(driver, wait, text_pattern, fallback_xpath, error_msg, retrie
         TimeoutException: If element cannot be found after all retries
         ElementClickInterceptedException: If element cannot be clicked after all retries
     """
+    candidates = [(By.XPATH, text_pattern)]
+    if fallback_xpath and fallback_xpath != text_pattern:
+        candidates.append((By.XPATH, fallback_xpath))
     for attempt in range(retries):
         try:
-            try:
-                # If text_pattern fails, try fallback xpath
-                element = wait.until(EC.element_to_be_clickable((By.XPATH, text_pattern)))
-                element.click()
-                return True
-            except:
-                # Try fallback xpath first
-                log(f"Primary text_pattern failed, trying fallback for: {error_msg}")
-                element = wait.until(EC.element_to_be_clickable((By.XPATH, fallback_xpath)))
-                element.click()
-                return True
+            element, locator = find_first(
+                driver,
+                name or text_pattern,
+                candidates,
+                condition=EC.element_to_be_clickable,
+                timeout=timeout
+            )
+            element.click()
+            return True
         except (TimeoutException, ElementClickInterceptedException) as e:
             if attempt == retries - 1:
                 log(f"{error_msg}: {str(e)}", "error")
@@ -45,3 +73,25 @@ def wait_and_click(driver, wait, text_pattern, fallback_xpath, error_msg, retrie
             time.sleep(2)
     return False
 
+
+def wait_for_condition(driver, condition, description, timeout=5):
+    """Wait for an explicit DOM condition without failing the flow on timeout.
+    
+    Used after an action to confirm its effect (a dropdown opened, a filter
+    applied, a modal closed) instead of sleeping for a fixed time.
+    
+    Args:
+        driver: Selenium WebDriver instance
+        condition: Expected condition callable taking the driver
+        description: Description of the condition for logging
+        timeout: Maximum number of seconds to wait (default: 5)
+        
+    Returns:
+        bool: True if the condition was met, False if it timed out
+    """
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(condition)
+        return True
+    except TimeoutException:
+        log(f"Timed out after {timeout}s waiting for {description}, continuing")
+        return False
@@ -0,0 +1,51 @@
+"""Step timing utilities for measuring where automation time goes."""
+
+import time
+from contextlib import contextmanager
+from utils.logger import log
+
+
+class StepTimer:
+    """Record the duration of named steps in a flow and log a summary.
+
+    Usage:
+        timer = StepTimer("Export")
+        with timer.step("Open dropdown"):
+            ...
+        timer.log_summary()
+    """
+
+    def __init__(self, name):
+        """Create a timer for a flow.
+
+        Args:
+            name: Name of the flow, used as a prefix in log output
+        """
+        self.name = name
+        self.steps = []
+
+    @contextmanager
+    def step(self, label):
+        """Time the enclosed block and record it under label.
+
+        Args:
+            label: Name of the step
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.steps.append((label, duration))
+            log(f"[{self.name}] {label} took {duration:.2f}s")
+
+    @property
+    def total(self):
+        """Total seconds recorded across all steps."""
+        return sum(duration for _, duration in self.steps)
+
+    def log_summary(self):
+        """Log each recorded step and the total duration."""
+        log(f"[{self.name}] Step timings (total {self.total:.2f}s):")
+        for label, duration in self.steps:
+            log(f"  {label}: {duration:.2f}s")